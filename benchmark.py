@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import argparse
+import random
+import time
+from pathlib import Path
+from competitive_sudoku.matching import HallChecker
+from competitive_sudoku.solver import LARGE_BOARD_MIN_FILL, SolutionPool, check_move
+from competitive_sudoku.sudoku import GameState, SudokuBoard, load_sudoku, load_sudoku_from_text, print_board
+
+
+def measure(function, repetitions: int) -> float:
+    """
+    Measures the average running time of a function.
+    @param function: A function without arguments.
+    @param repetitions: The number of calls.
+    @return: The average time of a call in seconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        function()
+    return (time.perf_counter() - start) / repetitions
+
+
+def benchmark_board(board: SudokuBoard, repetitions: int, oracle_moves: int, rng: random.Random):
+    """
+    Measures the per-move costs of the basic operations of a game on a board.
+    @return: A list of pairs (operation, average time in seconds).
+    """
+    game_state = GameState(board, board.clone(), [], [], [0, 0])
+    moves = list(game_state.legal_moves())
+    sample = rng.sample(moves, min(len(moves), repetitions))
+    text = str(board)
+
+    def play_undo():
+        for move in sample:
+            game_state.play(move)
+            game_state.undo()
+
+    def rewards():
+        for move in sample:
+            board.move_reward(move.i, move.j)
+
+    result = [
+        ('legal moves', measure(lambda: list(game_state.legal_moves()), repetitions)),
+        ('move reward', measure(rewards, 1) / len(sample)),
+        ('play + undo', measure(play_undo, 1) / len(sample)),
+        ('clone', measure(board.clone, repetitions)),
+        ('to text', measure(lambda: str(board), repetitions)),
+        ('from text', measure(lambda: load_sudoku_from_text(text), repetitions)),
+        ('print board', measure(lambda: print_board(board), repetitions)),
+    ]
+
+    hall_checker = HallChecker(board)
+    result.append(('Hall check', measure(lambda: [hall_checker.check_move(move.i, move.j, move.value) for move in sample], 1) / len(sample)))
+
+    fill = 1 - board.squares.count(SudokuBoard.empty) / (board.N * board.N)
+    if oracle_moves and (board.N <= 16 or fill >= LARGE_BOARD_MIN_FILL):
+        pool = SolutionPool(board, size=4)
+        oracle_sample = sample[:oracle_moves]
+        result.append(('oracle check', measure(lambda: [check_move(board, board.rc2f(move.i, move.j), move.value, pool) for move in oracle_sample], 1) / len(oracle_sample)))
+    return result
+
+
+def main():
+    cmdline_parser = argparse.ArgumentParser(description='Script for measuring the per-move costs of competitive sudoku on boards of increasing size.')
+    cmdline_parser.add_argument('--sizes', help="the region sizes m x n to measure (default: 2x2 3x3 4x4 5x5 6x6)", nargs='+', default=['2x2', '3x3', '4x4', '5x5', '6x6'])
+    cmdline_parser.add_argument('--repetitions', help="the number of repetitions of each measurement (default: 100)", type=int, default=100)
+    cmdline_parser.add_argument('--oracle-moves', help="the number of moves that are checked with the in-process oracle, 0 to skip (default: 5)", type=int, default=5)
+    cmdline_parser.add_argument('--empty', help="measure on empty boards instead of on the random boards; the oracle is skipped for N > 16", action='store_true')
+    args = cmdline_parser.parse_args()
+
+    rng = random.Random(0)
+    results = []
+    for size in args.sizes:
+        m, n = map(int, size.split('x'))
+        path = Path(f'boards/{"empty" if args.empty else "random"}-{m}x{n}.txt')
+        board = load_sudoku(str(path)) if path.exists() else SudokuBoard(m, n)
+        results.append((size, benchmark_board(board, args.repetitions, args.oracle_moves, rng)))
+        print(f'measured {size}', flush=True)
+
+    operations = max((timings for _, timings in results), key=len)
+    print(f'\n{"per move (us)":<14}' + ''.join(f'{size:>12}' for size, _ in results))
+    for index, (operation, _) in enumerate(operations):
+        print(f'{operation:<14}' + ''.join(f'{timings[index][1] * 1e6:>12.1f}' if index < len(timings) else f'{"-":>12}'
+                                           for _, timings in results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# A compact binary file format for collections of sudoku boards with the same region size.
+#
+# A corpus file consists of a 16 byte header, followed by the boards. The header contains the magic bytes b'SDKC',
+# the format version, the region size m x n and the number of boards, as little endian integers. Every board is
+# stored as its N*N squares, with one byte per square (two bytes if N > 255), exactly like SudokuBoard.squares.
+# Boards therefore have a fixed size, and board k can be located without reading the boards before it.
+
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Iterable, Iterator, List
+from competitive_sudoku.sudoku import SudokuBoard, load_sudoku_from_text
+
+MAGIC = b'SDKC'
+VERSION = 1
+_HEADER = struct.Struct('<4sHHHxxI')  # magic, version, m, n, padding, count
+
+
+def _board_size(m: int, n: int) -> int:
+    N = m * n
+    return N * N * array(SudokuBoard.typecode(N)).itemsize
+
+
+class CorpusWriter(object):
+    """
+    Writes boards to a corpus file one at a time, so that a corpus can be generated without keeping all boards in
+    memory. The number of boards in the header is filled in by close.
+    """
+
+    def __init__(self, filename: str, m: int, n: int):
+        """
+        Creates a corpus file for boards with regions of size m x n. An existing file is overwritten.
+        @param filename: A file name.
+        @param m: The number of rows in a region.
+        @param n: The number of columns in a region.
+        """
+        self.m = m
+        self.n = n
+        self.count = 0
+        self.file = open(filename, 'wb')
+        self.file.write(_HEADER.pack(MAGIC, VERSION, m, n, 0))
+
+    def add(self, board: SudokuBoard) -> None:
+        """
+        Appends a board to the corpus.
+        @param board: A sudoku board with regions of size m x n.
+        """
+        if (board.m, board.n) != (self.m, self.n):
+            raise RuntimeError(f'Cannot add a board with regions of size {board.m}x{board.n} to a corpus with regions of size {self.m}x{self.n}.')
+        self.add_squares(board.squares)
+
+    def add_squares(self, squares: array) -> None:
+        """
+        Appends a board to the corpus, given the values of its squares.
+        @param squares: An array with typecode SudokuBoard.typecode(m * n) containing the N*N values of the board.
+        """
+        if len(squares) != self.m * self.n * self.m * self.n:
+            raise RuntimeError('The number of squares in the sudoku is incorrect.')
+        if squares.itemsize > 1 and sys.byteorder == 'big':
+            squares = array(squares.typecode, squares)
+            squares.byteswap()
+        self.file.write(squares.tobytes())
+        self.count += 1
+
+    def close(self) -> None:
+        """
+        Writes the number of boards to the header, and closes the file.
+        """
+        if self.file.closed:
+            return
+        self.file.seek(0)
+        self.file.write(_HEADER.pack(MAGIC, VERSION, self.m, self.n, self.count))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_corpus(filename: str, boards: Iterable[SudokuBoard]) -> int:
+    """
+    Writes boards to a corpus file.
+    @param filename: A file name.
+    @param boards: A non-empty sequence of sudoku boards, that all have the same region size.
+    @return: The number of boards that was written.
+    """
+    boards = iter(boards)
+    first = next(boards, None)
+    if first is None:
+        raise RuntimeError('A corpus must contain at least one board.')
+    with CorpusWriter(filename, first.m, first.n) as writer:
+        writer.add(first)
+        for board in boards:
+            writer.add(board)
+    return writer.count
+
+
+class Corpus(object):
+    """
+    Read-only access to a corpus file. The file is memory mapped, so opening a corpus takes constant time, and only
+    the boards that are accessed are read from disk. Processes that open the same corpus share its pages through
+    the operating system. A Corpus is pickled as its file name, so that passing it to a worker process reopens the
+    mapping instead of copying the boards.
+    """
+
+    def __init__(self, filename: str):
+        """
+        Opens a corpus file.
+        @param filename: A file name.
+        """
+        self.filename = str(filename)
+        with open(self.filename, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < _HEADER.size:
+            raise RuntimeError(f'The file {self.filename} is not a sudoku corpus.')
+        magic, version, m, n, count = _HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise RuntimeError(f'The file {self.filename} is not a sudoku corpus.')
+        if version != VERSION:
+            raise RuntimeError(f'The sudoku corpus {self.filename} has unsupported version {version}.')
+        self.m = m
+        self.n = n
+        self.N = m * n
+        self.count = count
+        self.board_size = _board_size(m, n)
+        if len(self.map) < _HEADER.size + count * self.board_size:
+            raise RuntimeError(f'The sudoku corpus {self.filename} is truncated.')
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _offset(self, index: int) -> int:
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError('corpus index out of range')
+        return _HEADER.size + index * self.board_size
+
+    def squares(self, index: int) -> memoryview:
+        """
+        Gets the squares of a board without copying them.
+        @param index: The index of a board.
+        @return: A read-only view of the N*N squares of the board in the mapped file. For N > 255 the values are
+        stored as little endian 16-bit integers, so the view only shows the right values on little endian machines.
+        """
+        offset = self._offset(index)
+        view = memoryview(self.map)[offset:offset + self.board_size]
+        return view.cast(SudokuBoard.typecode(self.N))
+
+    def __getitem__(self, index: int) -> SudokuBoard:
+        """
+        Gets a board. Its squares are copied from the mapped file as one block, and its bitmasks and counters are
+        computed from them with SudokuBoard.from_squares, so no text has to be parsed.
+        @param index: The index of a board.
+        @return: An independent sudoku board.
+        """
+        offset = self._offset(index)
+        squares = array(SudokuBoard.typecode(self.N))
+        squares.frombytes(self.map[offset:offset + self.board_size])
+        if squares.itemsize > 1 and sys.byteorder == 'big':
+            squares.byteswap()
+        return SudokuBoard.from_squares(self.m, self.n, squares)
+
+    def __iter__(self) -> Iterator[SudokuBoard]:
+        for index in range(self.count):
+            yield self[index]
+
+    def close(self) -> None:
+        """
+        Unmaps the file. Views returned by squares must be released first.
+        """
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __reduce__(self):
+        return self.__class__, (self.filename,)
+
+
+def load_sudokus_from_text(text: str) -> Iterator[SudokuBoard]:
+    """
+    Loads sudoku boards from a string that contains one or more boards in the format of SudokuBoard.__str__, e.g.
+    the concatenation of several board files.
+    @param text: A string representation of a sequence of sudoku boards.
+    @return: An iterator over the boards.
+    """
+    words = text.split()
+    position = 0
+    while position < len(words):
+        if position + 2 > len(words):
+            raise RuntimeError('The string does not contain a sudoku board')
+        N = int(words[position]) * int(words[position + 1])
+        end = position + 2 + N * N
+        if end > len(words):
+            raise RuntimeError('The number of squares in the sudoku is incorrect.')
+        yield load_sudoku_from_text(' '.join(words[position:end]))
+        position = end
+
+
+def text_to_corpus(text_filenames: List[str], corpus_filename: str) -> int:
+    """
+    Converts board files in the text format to a corpus. A text file may contain several boards.
+    @param text_filenames: A list of file names.
+    @param corpus_filename: The name of the corpus file that is created.
+    @return: The number of boards in the corpus.
+    """
+    def boards():
+        for filename in text_filenames:
+            yield from load_sudokus_from_text(Path(filename).read_text())
+    return write_corpus(corpus_filename, boards())
+
+
+def corpus_to_text(corpus_filename: str, text_filename: str) -> int:
+    """
+    Converts a corpus to a single text file, in which the boards appear one after another.
+    @param corpus_filename: The name of a corpus file.
+    @param text_filename: The name of the text file that is created.
+    @return: The number of boards that was converted.
+    """
+    with Corpus(corpus_filename) as corpus, open(text_filename, 'w') as file:
+        for board in corpus:
+            file.write(str(board))
+        return len(corpus)
+
+
+def main():
+    cmdline_parser = argparse.ArgumentParser(description='Converts between sudoku board files and binary sudoku corpus files.')
+    subparsers = cmdline_parser.add_subparsers(dest='command')
+    pack_parser = subparsers.add_parser('pack', help='create a corpus from board files')
+    pack_parser.add_argument('corpus', help='the corpus file that is created')
+    pack_parser.add_argument('boards', nargs='+', help='text files containing one or more boards')
+    unpack_parser = subparsers.add_parser('unpack', help='write the boards of a corpus to a text file')
+    unpack_parser.add_argument('corpus', help='a corpus file')
+    unpack_parser.add_argument('text', help='the text file that is created')
+    info_parser = subparsers.add_parser('info', help='print the region size and the number of boards of a corpus')
+    info_parser.add_argument('corpus', help='a corpus file')
+    args = cmdline_parser.parse_args()
+    if args.command is None:  # add_subparsers(required=True) needs Python 3.7
+        cmdline_parser.error('a command is required: pack, unpack or info')
+
+    if args.command == 'pack':
+        count = text_to_corpus(args.boards, args.corpus)
+        print(f'Wrote {count} boards to {args.corpus}.')
+    elif args.command == 'unpack':
+        count = corpus_to_text(args.corpus, args.text)
+        print(f'Wrote {count} boards to {args.text}.')
+    else:
+        with Corpus(args.corpus) as corpus:
+            print(f'{corpus.m}x{corpus.n} regions, {len(corpus)} boards')
+
+
+if __name__ == '__main__':
+    main()
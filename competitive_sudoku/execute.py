@@ -2,13 +2,21 @@
 #  Software License, (See accompanying file LICENSE or copy at
 #  https://www.gnu.org/licenses/gpl-3.0.txt)
 
+from collections import OrderedDict
+import hashlib
+import json
 import os
 from pathlib import Path
+import queue
+import shlex
+import sqlite3
+import subprocess
+import sys
 import tempfile
+from typing import Callable, Dict, List, Optional
 
 
 def execute_command(command: str) -> str:
-    import subprocess
     try:
         output = subprocess.check_output(command, stderr=subprocess.STDOUT, shell=True)
     except subprocess.CalledProcessError as proc:
@@ -16,17 +24,252 @@ def execute_command(command: str) -> str:
     return output.decode("utf-8").strip()
 
 
-def solve_sudoku(solve_sudoku_path: str, board_text: str, options: str='') -> str:
+def solve_sudoku(solve_sudoku_path: Optional[str], board_text: str, options: str='') -> str:
     """
     Execute the solve_sudoku program.
-    @param solve_sudoku_path: The location of the solve_sudoku executable.
+    @param solve_sudoku_path: The location of the solve_sudoku executable. If it is None, the in-process solver in
+    competitive_sudoku.solver is used instead.
     @param board_text: A string representation of a sudoku board.
     @param options: Additional command line options.
     @return: The output of solve_sudoku.
     """
+    if solve_sudoku_path is None:
+        from competitive_sudoku import solver
+        return solver.solve_sudoku(board_text, options)
     if not os.path.exists(solve_sudoku_path):
         raise RuntimeError(f'No oracle found at location "{solve_sudoku_path}"')
     filename = tempfile.NamedTemporaryFile(prefix='solve_sudoku_').name
     Path(filename).write_text(board_text)
-    command = f'{solve_sudoku_path} {filename} {options}'
-    return execute_command(command)
+    try:
+        command = f'{solve_sudoku_path} {filename} {options}'
+        return execute_command(command)
+    finally:
+        os.remove(filename)
+
+
+class OracleProcess(object):
+    """
+    A client for a long-lived oracle process. Instead of starting a new process for every query, the process is
+    started once and queries are exchanged over its stdin and stdout using a line protocol:
+
+    - a request is a single line with a JSON object {"board": <board text>, "options": <solve_sudoku options>}
+    - the response is a single line with a JSON object {"output": <the output of solve_sudoku>}
+
+    Any program that speaks this protocol can be used as an oracle. The in-process solver can be served with
+    'python -m competitive_sudoku.solver --serve', see OracleProcess.python. If the process dies, it is restarted
+    by the next query.
+    """
+
+    def __init__(self, command: List[str]):
+        """
+        Starts an oracle process.
+        @param command: The command line of the oracle process.
+        """
+        self.command = command
+        self._start()
+
+    def _start(self) -> None:
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        universal_newlines=True, bufsize=1)
+
+    @staticmethod
+    def python() -> 'OracleProcess':
+        """
+        Starts an oracle process that runs the in-process solver of competitive_sudoku.solver.
+        @return: The oracle process.
+        """
+        return OracleProcess([sys.executable, '-m', 'competitive_sudoku.solver', '--serve'])
+
+    def solve_sudoku(self, board_text: str, options: str = '') -> str:
+        """
+        Sends a query to the oracle process. This is a drop-in replacement of the solve_sudoku function. If the
+        process has died, a new one is started first. If it dies while answering the query, a RuntimeError is
+        raised, and the next query starts a new process.
+        @param board_text: A string representation of a sudoku board.
+        @param options: Command line options of solve_sudoku.
+        @return: The output of solve_sudoku.
+        """
+        if self.process.poll() is not None:
+            self._restart()
+        request = json.dumps({'board': board_text, 'options': options})
+        try:
+            self.process.stdin.write(request + '\n')
+            self.process.stdin.flush()
+            response = self.process.stdout.readline()
+        except (BrokenPipeError, OSError) as err:
+            self._restart()
+            raise RuntimeError(f'The oracle process "{" ".join(self.command)}" is not running') from err
+        if not response:
+            self._restart()
+            raise RuntimeError(f'The oracle process "{" ".join(self.command)}" terminated unexpectedly')
+        return json.loads(response)['output']
+
+    def _restart(self) -> None:
+        self.close()
+        self._start()
+
+    def close(self) -> None:
+        """
+        Stops the oracle process.
+        """
+        try:
+            self.process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass  # the process has died
+        if self.process.poll() is None:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class OraclePool(object):
+    """
+    A fixed size pool of oracle processes that can be shared by multiple threads, for example when running a
+    tournament. Every query is handled by an idle process of the pool.
+    """
+
+    def __init__(self, command: List[str], size: int):
+        """
+        Starts the oracle processes.
+        @param command: The command line of the oracle processes.
+        @param size: The number of processes.
+        """
+        self.processes = [OracleProcess(command) for _ in range(size)]
+        self.idle = queue.Queue()
+        for process in self.processes:
+            self.idle.put(process)
+
+    def solve_sudoku(self, board_text: str, options: str = '') -> str:
+        """
+        Sends a query to an idle oracle process. Blocks until a process is available.
+        @param board_text: A string representation of a sudoku board.
+        @param options: Command line options of solve_sudoku.
+        @return: The output of solve_sudoku.
+        """
+        process = self.idle.get()
+        try:
+            return process.solve_sudoku(board_text, options)
+        finally:
+            self.idle.put(process)
+
+    def close(self) -> None:
+        """
+        Stops all oracle processes.
+        """
+        for process in self.processes:
+            process.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# The name of the environment variable that contains the file name of the on-disk oracle cache
+ORACLE_CACHE_VARIABLE = 'SUDOKU_ORACLE_CACHE'
+
+
+class OracleCache(object):
+    """
+    Memoizes the results of an oracle. Results are kept in an in-memory LRU cache, and optionally in an SQLite
+    database on disk that can be shared between processes. Only deterministic queries are cached, i.e. --move
+    queries and solvability queries. Queries with --random or --greedy generate a random move, so they are always
+    passed on to the oracle.
+    """
+
+    def __init__(self, solve: Callable[[str, str], str], capacity: int = 65536, filename: Optional[str] = None):
+        """
+        Constructs a cache.
+        @param solve: The oracle, a function that maps a board text and options to the output of solve_sudoku.
+        @param capacity: The maximum number of results in the in-memory cache.
+        @param filename: The file name of the on-disk cache, or None if results are only cached in memory.
+        """
+        self.solve = solve
+        self.capacity = capacity
+        self.filename = filename
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        self._connection_pid = None
+
+    @staticmethod
+    def key(board_text: str, options: str) -> str:
+        """
+        Computes the cache key of a query. Board texts and options that only differ in white space have the same key.
+        @param board_text: A string representation of a sudoku board.
+        @param options: Command line options of solve_sudoku.
+        @return: A hexadecimal digest.
+        """
+        text = ' '.join(board_text.split()) + '\n' + ' '.join(shlex.split(options))
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _database(self) -> sqlite3.Connection:
+        # SQLite connections cannot be shared with forked processes, so every process opens its own connection.
+        if self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.filename, timeout=30, isolation_level=None)
+            self._connection.execute('CREATE TABLE IF NOT EXISTS oracle (key TEXT PRIMARY KEY, output TEXT)')
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def solve_sudoku(self, board_text: str, options: str = '') -> str:
+        """
+        Answers a query from the cache, or passes it on to the oracle.
+        @param board_text: A string representation of a sudoku board.
+        @param options: Command line options of solve_sudoku.
+        @return: The output of solve_sudoku.
+        """
+        if '--random' in options or '--greedy' in options:
+            return self.solve(board_text, options)
+        key = OracleCache.key(board_text, options)
+        output = self.results.get(key)
+        if output is not None:
+            self.results.move_to_end(key)
+            self.hits += 1
+            return output
+        if self.filename:
+            row = self._database().execute('SELECT output FROM oracle WHERE key = ?', (key,)).fetchone()
+            if row:
+                output = row[0]
+        if output is None:
+            self.misses += 1
+            output = self.solve(board_text, options)
+            if self.filename:
+                self._database().execute('INSERT OR IGNORE INTO oracle VALUES (?, ?)', (key, output))
+        else:
+            self.hits += 1
+        self.results[key] = output
+        if len(self.results) > self.capacity:
+            self.results.popitem(last=False)
+        return output
+
+
+_oracle_caches: Dict[Optional[str], OracleCache] = {}
+
+
+def cached_solve_sudoku(solve_sudoku_path: Optional[str], board_text: str, options: str='') -> str:
+    """
+    Execute the solve_sudoku program, with memoization of the results. There is one cache per solve_sudoku_path in
+    every process. If the environment variable SUDOKU_ORACLE_CACHE is set, the results are also stored in the SQLite
+    database with that name, which is shared between processes.
+    @param solve_sudoku_path: The location of the solve_sudoku executable, or None for the in-process solver.
+    @param board_text: A string representation of a sudoku board.
+    @param options: Additional command line options.
+    @return: The output of solve_sudoku.
+    """
+    cache = _oracle_caches.get(solve_sudoku_path)
+    if cache is None:
+        cache = OracleCache(lambda text, opts: solve_sudoku(solve_sudoku_path, text, opts),
+                            filename=os.environ.get(ORACLE_CACHE_VARIABLE))
+        _oracle_caches[solve_sudoku_path] = cache
+    return cache.solve_sudoku(board_text, options)
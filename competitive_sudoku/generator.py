@@ -0,0 +1,206 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Fast generation of random starting positions. A solved grid is sampled by applying random symmetries to one of a
+# small pool of base grids, and then squares are removed from it. The base grids are computed once per region size
+# by the solver; the resulting boards are solvable by construction, so the solver is not needed per board.
+
+import argparse
+import multiprocessing
+import random
+from array import array
+from pathlib import Path
+from typing import Iterator, List, Optional
+from competitive_sudoku.corpus import CorpusWriter
+from competitive_sudoku.solver import SudokuSolver
+from competitive_sudoku.sudoku import SudokuBoard
+
+# The number of base grids that is sampled per region size
+BASE_GRID_COUNT = 8
+
+_base_grids_cache = {}
+
+
+def _board_rng(seed: int, m: int, n: int, index: int) -> random.Random:
+    """
+    Gets the random generator for the board with the given index. It only depends on the seed, the region size and
+    the index, so a board does not depend on how the boards are divided over processes.
+    """
+    return random.Random(f'{seed} {m}x{n} {index}')
+
+
+def _shuffled_groups(group_count: int, group_size: int, rng: random.Random) -> List[int]:
+    """
+    Shuffles group_count groups of group_size consecutive lines, and the lines within every group.
+    @return: A permutation of the lines.
+    """
+    groups = list(range(group_count))
+    rng.shuffle(groups)
+    result = []
+    for group in groups:
+        lines = list(range(group * group_size, (group + 1) * group_size))
+        rng.shuffle(lines)
+        result.extend(lines)
+    return result
+
+
+def base_grids(m: int, n: int, seed: int = 0) -> List[array]:
+    """
+    Gets the base grids for regions of size m x n. They are random solutions of the empty board, so boards of
+    different base grids are generally not related by a symmetry. The grids only depend on the seed, and they are
+    computed once per process.
+    @param m: The number of rows in a region.
+    @param n: The number of columns in a region.
+    @param seed: The seed of the random generator of the solver.
+    @return: A list of BASE_GRID_COUNT grids, each with the N*N values of the grid.
+    """
+    key = (m, n, seed)
+    if key not in _base_grids_cache:
+        N = m * n
+        rng = random.Random(f'{seed} {m}x{n} base')
+        _base_grids_cache[key] = [array(SudokuBoard.typecode(N), SudokuSolver(SudokuBoard(m, n)).solve(rng))
+                                  for _ in range(BASE_GRID_COUNT)]
+    return _base_grids_cache[key]
+
+
+def solved_squares(m: int, n: int, rng: random.Random, grids: Optional[List[array]] = None) -> array:
+    """
+    Samples a solved grid. A random base grid is transformed with a random permutation of the values, of the bands
+    of rows and the rows within a band, and of the stacks of columns and the columns within a stack. If m = n, the
+    grid is also transposed with probability 1/2.
+    @param m: The number of rows in a region.
+    @param n: The number of columns in a region.
+    @param rng: A random generator.
+    @param grids: The base grids. By default base_grids(m, n) is used.
+    @return: The N*N values of the grid, with typecode SudokuBoard.typecode(N).
+    """
+    N = m * n
+    grid = rng.choice(grids or base_grids(m, n))
+    values = [SudokuBoard.empty] + rng.sample(range(1, N + 1), N)  # a random permutation of the values 1, ..., N
+    rows = _shuffled_groups(n, m, rng)     # n bands of m rows
+    columns = _shuffled_groups(m, n, rng)  # m stacks of n columns
+    if m == n and rng.random() < 0.5:
+        return array(SudokuBoard.typecode(N), [values[grid[N * i + j]] for j in columns for i in rows])
+    return array(SudokuBoard.typecode(N), [values[grid[N * i + j]] for i in rows for j in columns])
+
+
+def generate_squares(m: int, n: int, fill: float, rng: random.Random, grids: Optional[List[array]] = None) -> array:
+    """
+    Generates the squares of a random solvable starting position.
+    @param m: The number of rows in a region.
+    @param n: The number of columns in a region.
+    @param fill: The fraction of the squares that is filled, in the range [0, 1].
+    @param rng: A random generator.
+    @param grids: The base grids. By default base_grids(m, n) is used.
+    @return: The N*N values of the board, with typecode SudokuBoard.typecode(N).
+    """
+    N = m * n
+    squares = solved_squares(m, n, rng, grids)
+    for k in rng.sample(range(N * N), N * N - round(fill * N * N)):
+        squares[k] = SudokuBoard.empty
+    return squares
+
+
+def generate_board(m: int, n: int, fill: float = 0.5, rng: Optional[random.Random] = None) -> SudokuBoard:
+    """
+    Generates a random solvable starting position.
+    @param m: The number of rows in a region.
+    @param n: The number of columns in a region.
+    @param fill: The fraction of the squares that is filled, in the range [0, 1].
+    @param rng: A random generator. If None, the global random generator is used.
+    @return: The generated Sudoku board.
+    """
+    return SudokuBoard.from_squares(m, n, generate_squares(m, n, fill, rng or random))
+
+
+def _generate_chunk(m: int, n: int, fill: float, seed: int, start: int, end: int, grids: List[array]) -> List[array]:
+    return [generate_squares(m, n, fill, _board_rng(seed, m, n, index), grids) for index in range(start, end)]
+
+
+def _generate_chunk_star(args) -> List[array]:
+    return _generate_chunk(*args)
+
+
+def generate_squares_list(m: int, n: int, count: int, fill: float = 0.5, seed: int = 0, processes: int = 1,
+                          chunk_size: int = 1000) -> Iterator[array]:
+    """
+    Generates the squares of count random solvable starting positions. Board k is generated with a random generator
+    that only depends on seed and k, and with the base grids of seed, so the result is reproducible and does not
+    depend on the number of processes. The base grids are computed once, and passed on to the worker processes.
+    @param m: The number of rows in a region.
+    @param n: The number of columns in a region.
+    @param count: The number of boards.
+    @param fill: The fraction of the squares that is filled, in the range [0, 1].
+    @param seed: The seed of the random generators.
+    @param processes: The number of worker processes. If 1, the boards are generated in the current process.
+    @param chunk_size: The number of boards that a worker generates per task.
+    @return: An iterator over the squares of the boards, in order.
+    """
+    grids = base_grids(m, n, seed)
+    chunks = [(m, n, fill, seed, start, min(start + chunk_size, count), grids) for start in range(0, count, chunk_size)]
+    if processes == 1:
+        for chunk in chunks:
+            yield from _generate_chunk(*chunk)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        for squares_list in pool.imap(_generate_chunk_star, chunks):
+            yield from squares_list
+
+
+def generate_boards(m: int, n: int, count: int, fill: float = 0.5, seed: int = 0, processes: int = 1) -> Iterator[SudokuBoard]:
+    """
+    Generates count random solvable starting positions. See generate_squares_list.
+    @return: An iterator over the generated boards.
+    """
+    for squares in generate_squares_list(m, n, count, fill, seed, processes):
+        yield SudokuBoard.from_squares(m, n, squares)
+
+
+def generate_corpus(filename: str, m: int, n: int, count: int, fill: float = 0.5, seed: int = 0,
+                    processes: int = 1) -> None:
+    """
+    Generates random solvable starting positions, and writes them to a corpus file. See generate_squares_list.
+    @param filename: The name of the corpus file that is created.
+    """
+    with CorpusWriter(filename, m, n) as writer:
+        for squares in generate_squares_list(m, n, count, fill, seed, processes):
+            writer.add_squares(squares)
+
+
+def generate_text_files(directory: str, m: int, n: int, count: int, fill: float = 0.5, seed: int = 0,
+                        processes: int = 1) -> None:
+    """
+    Generates random solvable starting positions, and saves them in the directory as the text files
+    random-{m}x{n}-{k}.txt, that can be read with load_sudoku. See generate_squares_list.
+    @param directory: The name of a directory. It is created if it does not exist.
+    """
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    for index, board in enumerate(generate_boards(m, n, count, fill, seed, processes)):
+        (path / f'random-{m}x{n}-{index}.txt').write_text(str(board))
+
+
+def main():
+    cmdline_parser = argparse.ArgumentParser(description='Generates random solvable sudoku starting positions.')
+    cmdline_parser.add_argument('size', help="the region size m x n, e.g. 3x3")
+    cmdline_parser.add_argument('count', help="the number of boards", type=int)
+    cmdline_parser.add_argument('--fill', help="the fraction of the squares that is filled (default: 0.5)", type=float, default=0.5)
+    cmdline_parser.add_argument('--seed', help="the random seed (default: 0)", type=int, default=0)
+    cmdline_parser.add_argument('--processes', help="the number of worker processes (default: 1)", type=int, default=1)
+    group = cmdline_parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--corpus', metavar='FILE', help="write the boards to this corpus file")
+    group.add_argument('--directory', metavar='DIR', help="write the boards as text files to this directory")
+    args = cmdline_parser.parse_args()
+
+    if not 0 <= args.fill <= 1:
+        cmdline_parser.error('the fill ratio must be in the range [0, 1]')
+    m, n = map(int, args.size.split('x'))
+    if args.corpus:
+        generate_corpus(args.corpus, m, n, args.count, args.fill, args.seed, args.processes)
+    else:
+        generate_text_files(args.directory, m, n, args.count, args.fill, args.seed, args.processes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# A fast necessary condition for the solvability of a sudoku, based on bipartite matching.
+
+from typing import List
+from competitive_sudoku.sudoku import SudokuBoard
+
+
+def _augment(match: List[int], candidates, k: int, visited: List[int]) -> bool:
+    """
+    Searches an augmenting path that starts in square k, and flips it.
+    @param visited: A one element list with the bitmask of the values that were already visited.
+    @return: True if an augmenting path was found.
+    """
+    mask = candidates[k]
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        if visited[0] & bit:
+            continue
+        visited[0] |= bit
+        v = bit.bit_length() - 1
+        other = match[v]
+        if other == -1 or _augment(match, candidates, other, visited):
+            match[v] = k
+            return True
+    return False
+
+
+def extend_matching(match: List[int], candidates, squares) -> bool:
+    """
+    Extends a matching between the squares and the values of a unit with augmenting paths, such that the given
+    squares are matched.
+    @param match: match[v - 1] is the square that is matched to value v, or -1. It is modified in place.
+    @param candidates: Maps every square of the unit to the bitmask of its candidate values.
+    @param squares: Squares of the unit that are not matched yet.
+    @return: False if some square could not be matched, i.e. the unit has no perfect matching.
+    """
+    for k in squares:
+        if not _augment(match, candidates, k, [0]):
+            return False
+    return True
+
+
+class HallChecker(object):
+    """
+    Maintains for every unit (row, column and region) of a board a matching between its empty squares and its
+    missing values, using the candidates of the squares. By Hall's theorem such a perfect matching exists if and
+    only if no group of k empty squares of the unit has fewer than k candidate values together. If some unit has no
+    perfect matching, that unit cannot be filled, and the sudoku has no solution.
+
+    The check is much cheaper than solving the sudoku, but it is only a necessary condition: a board that passes it
+    can still be unsolvable. After a move, only the matchings that used the square or the value of the move are
+    repaired with augmenting paths.
+    """
+
+    def __init__(self, board: SudokuBoard):
+        """
+        Constructs the matchings for the current position of a board.
+        @param board: A sudoku board. It is copied.
+        """
+        self.board = board.clone()
+        N = board.N
+        self.N = N
+        self.geometry = board.geometry
+        # matches[u][v - 1] is the square that is matched to value v in unit u, or -1
+        self.matches: List[List[int]] = [[-1] * N for _ in range(3 * N)]
+        self.unmatched = set()  # units without a perfect matching
+        self.trail = []   # (unit, previous matching of the unit, previously unmatched)
+        self.levels = []  # (length of the trail, square) for every put
+        for u in range(3 * N):
+            self._match_unit(u)
+
+    def _unit_ids(self, k: int):
+        N = self.N
+        i, j, r = self.geometry.square_units[k]
+        return i, N + j, 2 * N + r
+
+    def _match_unit(self, u: int, squares=None) -> None:
+        """
+        Extends the matching of unit u such that the given squares (by default all empty squares) are matched.
+        """
+        board = self.board
+        match = self.matches[u]
+        candidates = {k: board.candidates(*divmod(k, self.N)) for k in self.geometry.units[u]
+                      if board.squares[k] == SudokuBoard.empty}
+        if squares is None:
+            squares = [k for k in candidates if k not in match]
+        if not extend_matching(match, candidates, squares):
+            self.unmatched.add(u)
+
+    def is_fillable(self) -> bool:
+        """
+        Checks if every unit has a perfect matching.
+        @return: False if some unit can certainly not be filled, i.e. the sudoku has no solution.
+        """
+        return not self.unmatched
+
+    def put(self, i: int, j: int, value: int) -> bool:
+        """
+        Puts a value on an empty square of the board and repairs the matchings. It can be taken back using undo.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @param value: A value in the range [1, ..., N]
+        @return: False if some unit can certainly not be filled after the move.
+        """
+        N = self.N
+        k = N * i + j
+        v = value - 1
+        self.levels.append((len(self.trail), k))
+        self.board.put(i, j, value)
+        units = self._unit_ids(k)
+
+        # The units of the square lose the square and the value.
+        repairs = {}
+        for u in units:
+            self._save(u)
+            match = self.matches[u]
+            if k in match:
+                match[match.index(k)] = -1
+            other = match[v]
+            match[v] = -1
+            if other not in (-1, k):
+                repairs.setdefault(u, []).append(other)
+
+        # The other units of the peers lose the value as a candidate.
+        for p in self.geometry.peers[k]:
+            for u in self._unit_ids(p):
+                if u not in units and self.matches[u][v] == p:
+                    self._save(u)
+                    self.matches[u][v] = -1
+                    repairs.setdefault(u, []).append(p)
+
+        for u, squares in repairs.items():
+            if u not in self.unmatched:
+                self._match_unit(u, squares)
+        return not self.unmatched
+
+    def check_move(self, i: int, j: int, value: int) -> bool:
+        """
+        Checks if a move keeps every unit fillable. The board is not changed.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @param value: A value in the range [1, ..., N]
+        @return: False if the move certainly makes the sudoku unsolvable.
+        """
+        result = self.put(i, j, value)
+        self.undo()
+        return result
+
+    def undo(self) -> None:
+        """
+        Takes back the last put.
+        """
+        trail_length, k = self.levels.pop()
+        while len(self.trail) > trail_length:
+            u, match, unmatched = self.trail.pop()
+            self.matches[u] = match
+            if unmatched:
+                self.unmatched.add(u)
+            else:
+                self.unmatched.discard(u)
+        i, j = divmod(k, self.N)
+        self.board.put(i, j, SudokuBoard.empty)
+
+    def _save(self, u: int) -> None:
+        trail_length = self.levels[-1][0] if self.levels else 0
+        for index in range(len(self.trail) - 1, trail_length - 1, -1):
+            if self.trail[index][0] == u:
+                return  # the unit was already saved for this put
+        self.trail.append((u, self.matches[u][:], u in self.unmatched))
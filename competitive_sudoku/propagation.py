@@ -0,0 +1,268 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Incremental constraint propagation for sudoku boards.
+
+from typing import List
+from competitive_sudoku.matching import extend_matching
+from competitive_sudoku.sudoku import Move, SudokuBoard
+
+
+class Propagator(object):
+    """
+    Maintains for every square of a board the set of candidate values that survive constraint propagation. The
+    following rules are applied until nothing changes:
+
+    - naked single: if a square has one candidate left, the value is removed from the candidates of its peers
+    - hidden single: if a value fits in only one square of a unit, the other candidates of that square are removed
+    - pointing: if the candidates for a value in a region all lie in one row (column), the value is removed from
+      the rest of that row (column)
+    - claiming: if the candidates for a value in a row (column) all lie in one region, the value is removed from the
+      rest of that region
+    - Hall: if the squares of a unit have no perfect matching with the values using their candidates, the position
+      is inconsistent (see competitive_sudoku.matching)
+
+    The rules are sound: a value that is removed cannot occur in any solution, so a move that puts it on the board
+    makes the sudoku unsolvable. If a square or a unit runs out of candidates, the position has no solution.
+
+    Squares are identified by their index k in the board array, and units are numbered as in SudokuGeometry.units:
+    rows first, then columns, then regions. Changes are recorded on a trail, so assign can be undone cheaply.
+    """
+
+    def __init__(self, board: SudokuBoard):
+        """
+        Constructs a propagator for the current position of a board, and propagates the constraints.
+        @param board: A sudoku board. It is not modified.
+        """
+        N = board.N
+        self.N = N
+        self.geometry = board.geometry
+        self.full_mask = board.full_mask
+        self.assigned = [value != SudokuBoard.empty for value in board.squares]
+        self.masks = [1 << (value - 1) if value != SudokuBoard.empty else board.candidates(*board.f2rc(k))
+                      for k, value in enumerate(board.squares)]
+        self.trail = []   # (k, previous mask)
+        self.levels = []  # (length of the trail, assigned square, previous consistent) for every assign
+        self._singles = [k for k in range(N * N) if self.masks[k] & (self.masks[k] - 1) == 0]
+        self._dirty_units = set(range(3 * N))
+        # matches[u][v - 1] is the square that is matched to value v in unit u, or -1. Undo only adds candidates, so
+        # a matching stays valid when assignments are taken back, and it does not need to be restored.
+        self.matches = [[-1] * N for _ in range(3 * N)]
+        self.consistent = self._propagate()
+
+    def candidates(self, i: int, j: int) -> int:
+        """
+        Gets the candidate values of the square with coordinates (i, j) that survive propagation.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @return: A bitmask in which bit (v - 1) is set if value v is a candidate. It is 0 for assigned squares.
+        """
+        k = self.N * i + j
+        return 0 if self.assigned[k] else self.masks[k]
+
+    def forced(self) -> List[Move]:
+        """
+        Gets the squares that are not assigned, but that have only one candidate left.
+        @return: The forced moves.
+        """
+        N = self.N
+        return [Move(k // N, k % N, mask.bit_length()) for k, mask in enumerate(self.masks)
+                if not self.assigned[k] and mask and mask & (mask - 1) == 0]
+
+    def legal_moves(self) -> List[Move]:
+        """
+        Gets the moves on unassigned squares with values that survive propagation. If the position is inconsistent,
+        there are no such moves.
+        @return: A list of moves, ordered by square and then by value.
+        """
+        if not self.consistent:
+            return []
+        N = self.N
+        result = []
+        for k, mask in enumerate(self.masks):
+            if self.assigned[k]:
+                continue
+            while mask:
+                bit = mask & -mask
+                result.append(Move(k // N, k % N, bit.bit_length()))
+                mask ^= bit
+        return result
+
+    def assign(self, i: int, j: int, value: int) -> bool:
+        """
+        Puts a value on an empty square and propagates the consequences. It can be taken back using undo.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @param value: A value in the range [1, ..., N]
+        @return: False if a contradiction was found, i.e. the sudoku has no solution after the move.
+        """
+        k = self.N * i + j
+        self.levels.append((len(self.trail), k, self.consistent))
+        self.assigned[k] = True
+        if self.consistent:
+            bit = 1 << (value - 1)
+            if self.masks[k] & bit:
+                self._set_mask(k, bit)
+                self.consistent = self._propagate()
+            else:
+                self.consistent = False
+        return self.consistent
+
+    def undo(self) -> None:
+        """
+        Takes back the last assign.
+        """
+        trail_length, k, consistent = self.levels.pop()
+        trail = self.trail
+        masks = self.masks
+        while len(trail) > trail_length:
+            square, mask = trail.pop()
+            masks[square] = mask
+        self.assigned[k] = False
+        self.consistent = consistent
+
+    def _set_mask(self, k: int, mask: int) -> None:
+        self.trail.append((k, self.masks[k]))
+        self.masks[k] = mask
+        if mask & (mask - 1) == 0:
+            self._singles.append(k)
+        N = self.N
+        i, j, r = self.geometry.square_units[k]
+        self._dirty_units.update((i, N + j, 2 * N + r))
+
+    def _eliminate(self, squares, bits: int) -> bool:
+        """
+        Removes the values in bits from the candidates of the given squares.
+        @return: False if a square runs out of candidates.
+        """
+        masks = self.masks
+        for k in squares:
+            mask = masks[k]
+            if mask & bits:
+                mask &= ~bits
+                self._set_mask(k, mask)
+                if not mask:
+                    return False
+        return True
+
+    def _propagate(self) -> bool:
+        """
+        Applies the propagation rules until a fixpoint is reached.
+        @return: False if a contradiction was found.
+        """
+        N = self.N
+        masks = self.masks
+        peers = self.geometry.peers
+        units = self.geometry.units
+        singles = self._singles
+        dirty_units = self._dirty_units
+        changed_units = set()
+        try:
+            while singles or dirty_units:
+                while singles:
+                    k = singles.pop()
+                    if not masks[k] or not self._eliminate(peers[k], masks[k]):
+                        return False
+                while dirty_units and not singles:
+                    u = dirty_units.pop()
+                    changed_units.add(u)
+                    if not self._propagate_unit(units[u]):
+                        return False
+                    if u >= 2 * N and not self._propagate_region(u - 2 * N):
+                        return False
+                    if u < 2 * N and not self._propagate_line(u):
+                        return False
+            return all(self._match_unit(u) for u in changed_units)
+        finally:
+            singles.clear()
+            dirty_units.clear()
+
+    def _propagate_unit(self, squares) -> bool:
+        # hidden singles: compute the values that occur in at least one and in at least two squares of the unit
+        masks = self.masks
+        once = 0
+        twice = 0
+        for k in squares:
+            mask = masks[k]
+            twice |= once & mask
+            once |= mask
+        if once != self.full_mask:
+            return False
+        hidden = once & ~twice
+        while hidden:
+            bit = hidden & -hidden
+            hidden ^= bit
+            for k in squares:
+                if masks[k] & bit:
+                    if masks[k] != bit:
+                        self._set_mask(k, bit)
+                    break
+        return True
+
+    def _propagate_region(self, r: int) -> bool:
+        # pointing: values of the region that are confined to one row or one column of the region
+        geometry = self.geometry
+        m, n, N = geometry.m, geometry.n, self.N
+        squares = geometry.region_squares[r]
+        region = set(squares)
+        for lines, line_squares in (([squares[a * n:(a + 1) * n] for a in range(m)], geometry.row_squares),
+                                    ([squares[b::n] for b in range(n)], geometry.column_squares)):
+            unions = [self._union(line) for line in lines]
+            for index, line in enumerate(lines):
+                others = 0
+                for other, union in enumerate(unions):
+                    if other != index:
+                        others |= union
+                confined = unions[index] & ~others
+                if confined:
+                    k = line[0]
+                    line_index = k // N if line_squares is geometry.row_squares else k % N
+                    if not self._eliminate([s for s in line_squares[line_index] if s not in region], confined):
+                        return False
+        return True
+
+    def _propagate_line(self, u: int) -> bool:
+        # claiming: values of a row or column that are confined to one region
+        geometry = self.geometry
+        m, n, N = geometry.m, geometry.n, self.N
+        if u < N:
+            line = geometry.row_squares[u]
+            segments = [line[c * n:(c + 1) * n] for c in range(m)]
+        else:
+            line = geometry.column_squares[u - N]
+            segments = [line[a * m:(a + 1) * m] for a in range(n)]
+        unions = [self._union(segment) for segment in segments]
+        line_set = set(line)
+        for index, segment in enumerate(segments):
+            others = 0
+            for other, union in enumerate(unions):
+                if other != index:
+                    others |= union
+            confined = unions[index] & ~others
+            if confined:
+                region = geometry.region_squares[geometry.square_regions[segment[0]]]
+                if not self._eliminate([s for s in region if s not in line_set], confined):
+                    return False
+        return True
+
+    def _match_unit(self, u: int) -> bool:
+        # Hall: the squares of the unit must have a perfect matching with the values, using their candidates
+        masks = self.masks
+        match = self.matches[u]
+        matched = set()
+        for v in range(self.N):
+            k = match[v]
+            if k != -1:
+                if masks[k] >> v & 1:
+                    matched.add(k)
+                else:
+                    match[v] = -1
+        return extend_matching(match, masks, [k for k in self.geometry.units[u] if k not in matched])
+
+    def _union(self, squares) -> int:
+        masks = self.masks
+        result = 0
+        for k in squares:
+            result |= masks[k]
+        return result
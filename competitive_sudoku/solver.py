@@ -0,0 +1,606 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# An in-process sudoku solver, and an oracle that reproduces the behavior of the solve_sudoku program.
+
+import json
+import random
+import shlex
+import sys
+from typing import Iterator, List, Optional, Set, Tuple
+from competitive_sudoku.propagation import Propagator
+from competitive_sudoku.sudoku import Move, SudokuBoard, TabooMove, load_sudoku_from_text
+
+# The minimum fraction of filled squares for which check_move stays fast on boards with N > 16. On sparser boards
+# with 5x5 or 6x6 regions, the solver can take minutes to check a single move.
+LARGE_BOARD_MIN_FILL = 0.6
+
+
+class SudokuSolver(object):
+    """
+    A solver for sudokus with rectangular regions. It performs an exact cover search: every empty square must get
+    exactly one value, and every value must occur exactly once in every row, column and region. The search branches
+    on the unassigned square with the fewest candidates.
+
+    On small boards the candidates are simply taken from the used-value bitmasks of the units. From 4x4 regions on,
+    where that search gets lost in sparse positions, the constraints are propagated after every assignment (see
+    competitive_sudoku.propagation), and solve restarts the search with a growing node limit. This costs more per
+    node, but keeps the search tractable up to 6x6 regions.
+    """
+
+    # The smallest value of N for which constraint propagation is used by default
+    propagation_threshold = 16
+
+    def __init__(self, board: SudokuBoard, propagate: Optional[bool] = None):
+        """
+        Constructs a solver for the current position of a board. The board itself is not modified.
+        @param board: A sudoku board.
+        @param propagate: If True, constraint propagation is used. By default it is used if N is at least
+        SudokuSolver.propagation_threshold.
+        """
+        self.N = board.N
+        self.propagate = board.N >= SudokuSolver.propagation_threshold if propagate is None else propagate
+        if self.propagate:
+            self.propagator = Propagator(board)
+        else:
+            self.geometry = board.geometry
+            self.full_mask = board.full_mask
+            self.squares = list(board.squares)
+            self.row_masks = board.row_masks[:]
+            self.column_masks = board.column_masks[:]
+            self.region_masks = board.region_masks[:]
+
+    def solutions(self, rng: Optional[random.Random] = None) -> Iterator[List[int]]:
+        """
+        Enumerates the solutions of the sudoku.
+        @param rng: If given, the values of a square are tried in random order, otherwise in increasing order.
+        @return: An iterator over the solutions. Each solution is a list with the values of the N*N squares.
+        """
+        if self.propagate:
+            return self._propagating_search(rng)
+        return self._search(rng)
+
+    def enumerate_solutions(self, limit: int, node_limit: Optional[int] = None) -> Tuple[List[List[int]], bool]:
+        """
+        Enumerates the solutions of the sudoku in a fixed order, up to a limit.
+        @param limit: The maximum number of solutions.
+        @param node_limit: If given, the search gives up after that many assignments. It requires constraint
+        propagation.
+        @return: The solutions that were found, and True if they are all the solutions of the sudoku.
+        """
+        if node_limit is not None and not self.propagate:
+            raise RuntimeError('SudokuSolver.enumerate_solutions with a node limit requires constraint propagation.')
+        search = self._propagating_search(None, node_limit) if self.propagate else self._search(None)
+        result = []
+        for solution in search:
+            result.append(solution)
+            if len(result) == limit:
+                break
+        search.close()
+        return result, len(result) < limit and not (self.propagate and self.aborted)
+
+    def _search(self, rng: Optional[random.Random]) -> Iterator[List[int]]:
+        squares = self.squares
+        row_masks = self.row_masks
+        column_masks = self.column_masks
+        region_masks = self.region_masks
+        square_units = self.geometry.square_units
+        full_mask = self.full_mask
+        empty_squares = [k for k, value in enumerate(squares) if value == SudokuBoard.empty]
+        E = len(empty_squares)
+        stack = []  # [k, untried values] for the squares that have been assigned, in order
+        position = 0  # empty_squares[:position] have been assigned
+
+        while True:
+            if position == E:
+                yield list(squares)
+            else:
+                # choose the unassigned square with the fewest candidates
+                best_index = -1
+                best_mask = 0
+                best_count = self.N + 1
+                for index in range(position, E):
+                    i, j, r = square_units[empty_squares[index]]
+                    mask = ~(row_masks[i] | column_masks[j] | region_masks[r]) & full_mask
+                    if not mask:
+                        best_count = 0
+                        break
+                    count = bin(mask).count('1')
+                    if count < best_count:
+                        best_index, best_mask, best_count = index, mask, count
+                        if count == 1:
+                            break
+                if best_count:
+                    empty_squares[position], empty_squares[best_index] = \
+                        empty_squares[best_index], empty_squares[position]
+                    stack.append([empty_squares[position], best_mask])
+                    position += 1
+
+            # assign the next untried value of the last assigned square, backtracking if there is none
+            while stack:
+                frame = stack[-1]
+                k = frame[0]
+                i, j, r = square_units[k]
+                value = squares[k]
+                if value != SudokuBoard.empty:
+                    bit = ~(1 << (value - 1))
+                    row_masks[i] &= bit
+                    column_masks[j] &= bit
+                    region_masks[r] &= bit
+                    squares[k] = SudokuBoard.empty
+                mask = frame[1]
+                if mask:
+                    if rng is None:
+                        bit = mask & -mask
+                    else:
+                        bit = rng.choice([1 << v for v in range(self.N) if mask >> v & 1])
+                    frame[1] = mask ^ bit
+                    row_masks[i] |= bit
+                    column_masks[j] |= bit
+                    region_masks[r] |= bit
+                    squares[k] = bit.bit_length()
+                    break
+                stack.pop()
+                position -= 1
+            else:
+                return
+
+    def _propagating_search(self, rng: Optional[random.Random], node_limit: Optional[int] = None) -> Iterator[List[int]]:
+        """
+        Enumerates the solutions with a depth first search that propagates the constraints after every assignment.
+        If node_limit is given, the search gives up after that many assignments, and sets self.aborted. The
+        propagator is restored to its initial position when the search ends.
+        """
+        N = self.N
+        propagator = self.propagator
+        self.aborted = False
+        if not propagator.consistent:
+            return
+        masks = propagator.masks
+        assigned = propagator.assigned
+        stack = []  # [k, untried values, assigned] for the squares that the search branched on, in order
+        nodes = 0
+
+        try:
+            while True:
+                # choose the unassigned square with the fewest candidates, breaking ties at random if rng is given
+                best_square = -1
+                best_count = N + 1
+                ties = 0
+                for k in range(N * N):
+                    if not assigned[k]:
+                        count = bin(masks[k]).count('1')
+                        if count < best_count:
+                            best_square, best_count, ties = k, count, 1
+                            if count == 1:
+                                break
+                        elif count == best_count and rng is not None:
+                            ties += 1
+                            if rng.random() * ties < 1:
+                                best_square = k
+                if best_square == -1:
+                    yield [mask.bit_length() for mask in masks]
+                else:
+                    stack.append([best_square, masks[best_square], False])
+
+                # assign the next untried value of the last square, backtracking if there is none
+                while stack:
+                    frame = stack[-1]
+                    k, mask, is_assigned = frame
+                    if is_assigned:
+                        propagator.undo()
+                        frame[2] = False
+                    if node_limit is not None and nodes >= node_limit:
+                        self.aborted = True
+                        mask = 0
+                    while mask:
+                        if rng is None:
+                            bit = mask & -mask
+                        else:
+                            bit = rng.choice([1 << v for v in range(N) if mask >> v & 1])
+                        mask ^= bit
+                        nodes += 1
+                        if propagator.assign(k // N, k % N, bit.bit_length()):
+                            frame[1] = mask
+                            frame[2] = True
+                            break
+                        propagator.undo()
+                    if frame[2]:
+                        break
+                    stack.pop()
+                else:
+                    return
+        finally:
+            # the search may be abandoned after a solution, with assignments on the stack
+            for frame in stack:
+                if frame[2]:
+                    propagator.undo()
+
+    def solve(self, rng: Optional[random.Random] = None) -> Optional[List[int]]:
+        """
+        Computes a solution of the sudoku.
+
+        With constraint propagation, the search is restarted with random square and value orders whenever it has
+        made N * N * 2**r assignments in restart r. A search that gets lost in a large subtree without
+        solutions is thereby abandoned quickly, while the growing limit keeps the solver complete. Without an rng,
+        the restarts use a fixed seed, so the result is still deterministic.
+        @param rng: If given, a random solution is computed.
+        @return: The values of the N*N squares of a solution, or None if the sudoku has no solution.
+        """
+        if not self.propagate:
+            return next(self.solutions(rng), None)
+        rng = rng or random.Random(0)
+        node_limit = self.N * self.N
+        while True:
+            search = self._propagating_search(rng, node_limit)
+            solution = next(search, None)
+            search.close()
+            if not self.aborted:
+                return solution
+            node_limit *= 2
+
+    def solve_after(self, i: int, j: int, value: int, rng: Optional[random.Random] = None) -> Optional[List[int]]:
+        """
+        Computes a solution of the sudoku after the move (i, j, value), like solve. The solver is left in its
+        original position, so one solver can check many moves without rebuilding its propagator. It requires
+        constraint propagation.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @param value: A value in the range [1, ..., N]
+        @param rng: If given, a random solution is computed.
+        @return: The values of the N*N squares of a solution, or None if the sudoku has no solution after the move.
+        """
+        if not self.propagate:
+            raise RuntimeError('SudokuSolver.solve_after requires constraint propagation.')
+        try:
+            if not self.propagator.assign(i, j, value):
+                return None
+            return self.solve(rng)
+        finally:
+            self.propagator.undo()
+
+
+def has_solution(board: SudokuBoard) -> bool:
+    """
+    Checks if a sudoku board has a solution.
+    @param board: A sudoku board.
+    @return: True if the board can be completed.
+    """
+    return SudokuSolver(board).solve() is not None
+
+
+def classify_moves(board: SudokuBoard, taboo_moves=(), rng: Optional[random.Random] = None,
+                   enumeration_limit: int = 256, samples: int = 16) -> Tuple[List[Move], List[TabooMove]]:
+    """
+    Classifies all legal moves of a board as safe (the sudoku remains solvable) or taboo (the sudoku becomes
+    unsolvable). A move is safe if and only if its value occurs in some solution. First the solutions are enumerated,
+    up to enumeration_limit. If all of them are found, this settles every move in a single search. Otherwise the
+    enumerated solutions differ in a few squares only, so random solutions are sampled as well. All searches use one
+    propagating solver. Every solution that was found proves that its values are safe, and the solver is only run
+    separately for a move that no earlier solution contains. Each of these runs also samples a random solution.
+    @param board: A sudoku board. It is not modified.
+    @param taboo_moves: Moves that are already known to be taboo. They are not classified.
+    @param rng: The random generator used to diversify the solutions. If None, a fixed seed is used.
+    @param enumeration_limit: The maximum number of solutions that is enumerated in the first phase.
+    @param samples: The number of random solutions that is sampled if the enumeration is incomplete.
+    @return: The safe moves and the taboo moves, ordered by square and then by value.
+    """
+    rng = rng or random.Random(0)
+    N = board.N
+    taboo = {(move.i, move.j, move.value) for move in taboo_moves}
+    moves = _allowed_moves(board, taboo)
+    safe_masks = [0] * (N * N)  # safe_masks[k] has bit (v - 1) set if value v on square k occurs in a solution
+
+    def mark(solution):
+        for k, value in enumerate(solution):
+            safe_masks[k] |= 1 << (value - 1)
+
+    solver = SudokuSolver(board, propagate=True)
+    solutions, complete = solver.enumerate_solutions(enumeration_limit, N * N * enumeration_limit)
+    for solution in solutions:
+        mark(solution)
+
+    if not complete:
+        for _ in range(samples):
+            solution = solver.solve(rng)
+            if solution is None:
+                break
+            mark(solution)
+
+    safe = []
+    unsafe = []
+    for (i, j, value) in moves:
+        k = N * i + j
+        if not safe_masks[k] >> (value - 1) & 1:
+            if complete:
+                unsafe.append(TabooMove(i, j, value))
+                continue
+            solution = solver.solve_after(i, j, value, rng)
+            if solution is None:
+                unsafe.append(TabooMove(i, j, value))
+                continue
+            mark(solution)
+        safe.append(Move(i, j, value))
+    return safe, unsafe
+
+
+class SolutionPool(object):
+    """
+    A pool of complete solutions that are consistent with the current position of a board. A move is provably safe,
+    i.e. it does not make the sudoku unsolvable, if some solution in the pool agrees with it. This is checked with a
+    bitmask lookup per square. A move that no pooled solution agrees with may still be safe.
+
+    The pool follows the board through play and undo, which makes it usable inside a search. Solutions that
+    contradict a played move are set aside until the move is undone. New solutions are sampled lazily with refill,
+    as soon as fewer than half of size solutions are left.
+    """
+
+    def __init__(self, board: SudokuBoard, size: int = 16, rng: Optional[random.Random] = None):
+        """
+        Constructs an empty pool for the current position of a board.
+        @param board: A sudoku board. It is copied.
+        @param size: The number of solutions that refill aims for.
+        @param rng: The random generator used for sampling solutions.
+        """
+        self.board = board.clone()
+        self.size = size
+        self.rng = rng or random.Random(0)
+        self.solutions: List[List[int]] = []
+        self.safe_masks = [0] * (board.N * board.N)  # the union of the values of the solutions, per square
+        # (k, the solutions that were set aside, exhausted) for every play
+        self.undo_stack: List[Tuple[int, List[List[int]], bool]] = []
+        # True if refill could not find size solutions in the current position or in a position before it; a play
+        # does not add solutions, so sampling again would be wasted
+        self.exhausted = False
+
+    def _update_masks(self) -> None:
+        safe_masks = [0] * len(self.safe_masks)
+        for solution in self.solutions:
+            for k, value in enumerate(solution):
+                safe_masks[k] |= 1 << (value - 1)
+        self.safe_masks = safe_masks
+
+    def refill(self) -> int:
+        """
+        Samples random solutions of the current position until the pool contains size solutions. Sampling stops
+        early if the position has no solution, or if the samples keep repeating solutions from the pool.
+        @return: The number of solutions in the pool.
+        """
+        # the restarts of the propagating search avoid the long runs that random value orders sometimes cause
+        solver = SudokuSolver(self.board, propagate=True)
+        attempts = 2 * self.size
+        while len(self.solutions) < self.size and attempts > 0:
+            attempts -= 1
+            solution = solver.solve(self.rng)
+            if solution is None:
+                break
+            self.add(solution)
+        self.exhausted = len(self.solutions) < self.size
+        return len(self.solutions)
+
+    def add(self, solution: List[int]) -> None:
+        """
+        Adds a solution of the current position to the pool, unless it is already in the pool.
+        @param solution: A list with the values of the N*N squares of a solution.
+        """
+        if solution in self.solutions:
+            return
+        self.solutions.append(solution)
+        for k, value in enumerate(solution):
+            self.safe_masks[k] |= 1 << (value - 1)
+
+    def safe_mask(self, i: int, j: int) -> int:
+        """
+        Gets the values that are provably safe on the square with coordinates (i, j). If less than half of size
+        solutions are left, the pool is refilled first, unless an earlier refill fell short (see exhausted).
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @return: A bitmask in which bit (v - 1) is set if value v occurs on the square in some pooled solution.
+        """
+        if 2 * len(self.solutions) < self.size and not self.exhausted:
+            self.refill()
+        return self.safe_masks[self.board.N * i + j]
+
+    def is_safe(self, i: int, j: int, value: int) -> bool:
+        """
+        Checks if the move (i, j, value) is provably safe.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @param value: A value in the range [1, ..., N]
+        @return: True if some pooled solution puts value on square (i, j).
+        """
+        return bool(self.safe_mask(i, j) >> (value - 1) & 1)
+
+    def play(self, i: int, j: int, value: int) -> None:
+        """
+        Puts a value on an empty square of the board, and sets aside the solutions that contradict it.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @param value: A value in the range [1, ..., N]
+        """
+        k = self.board.rc2f(i, j)
+        self.board.put(i, j, value)
+        removed = [solution for solution in self.solutions if solution[k] != value]
+        if removed:
+            self.solutions = [solution for solution in self.solutions if solution[k] == value]
+            self._update_masks()
+        self.undo_stack.append((k, removed, self.exhausted))
+
+    def undo(self) -> None:
+        """
+        Takes back the last move that was applied using play. Solutions that were sampled in the meantime remain
+        in the pool, since they are also consistent with the earlier position.
+        """
+        k, removed, self.exhausted = self.undo_stack.pop()
+        i, j = self.board.f2rc(k)
+        self.board.put(i, j, SudokuBoard.empty)
+        if removed:
+            self.solutions.extend(removed)
+            self._update_masks()
+
+    def sync(self, board: SudokuBoard) -> None:
+        """
+        Brings the pool to the position of the given board, which must be a continuation of the current position of
+        the pool, e.g. the board of the next turn in a game. The undo history is discarded.
+        @param board: A sudoku board.
+        """
+        for k, value in enumerate(board.squares):
+            if value != self.board.squares[k]:
+                if self.board.squares[k] != SudokuBoard.empty:
+                    raise RuntimeError('The board is not a continuation of the position of the solution pool.')
+                i, j = board.f2rc(k)
+                self.play(i, j, value)
+        self.undo_stack = []
+
+
+def _taboo_triples(text: str) -> Set[Tuple[int, int, int]]:
+    numbers = [int(word) for word in text.split()]
+    return set(zip(numbers[0::3], numbers[1::3], numbers[2::3]))
+
+
+def _allowed_moves(board: SudokuBoard, taboo: Set[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+    return [(move.i, move.j, move.value) for move in board.legal_moves() if (move.i, move.j, move.value) not in taboo]
+
+
+def check_move(board: SudokuBoard, k: int, value: int, pool: Optional[SolutionPool] = None) -> str:
+    """
+    Checks the move that puts value on the square with index k, and computes its score, like 'solve_sudoku --move'.
+    @param board: A sudoku board. It is not modified.
+    @param k: The index of a square in the range [0, ..., N * N).
+    @param value: A value in the range [1, ..., N].
+    @param pool: If given, a solution pool for the position of board. A move that a pooled solution agrees with is
+    accepted without running the solver, and a solution that the solver finds is added to the pool.
+    @return: The output of the oracle.
+    """
+    N = board.N
+    move_text = f'{k} {value}'
+    if not (0 <= k < N * N and 1 <= value <= N) or board.squares[k] != SudokuBoard.empty:
+        return f"Invalid move '{move_text}'."
+    i, j = board.f2rc(k)
+    if not board.is_legal(i, j, value):
+        return f"Illegal move '{move_text}'."
+    score = board.move_reward(i, j)
+    if pool is not None and pool.is_safe(i, j, value):
+        return f'The score is {score}.\nThe sudoku has a solution.'
+    after = board.clone()
+    after.put(i, j, value)
+    solution = SudokuSolver(after).solve()
+    if solution is None:
+        return f"The sudoku has no solution after move '{move_text}'."
+    if pool is not None:
+        pool.add(solution)
+    return f'The score is {score}.\nThe sudoku has a solution.'
+
+
+def generate_move(board: SudokuBoard, greedy: bool, taboo: Set[Tuple[int, int, int]] = frozenset(),
+                  rng: Optional[random.Random] = None) -> str:
+    """
+    Generates a random legal move that is not taboo, like 'solve_sudoku --random'. If greedy is True, the move is
+    chosen among the moves with the highest score, like 'solve_sudoku --greedy'.
+    @param board: A sudoku board.
+    @param greedy: If True, a move with maximal score is generated.
+    @param taboo: A set of taboo moves (i, j, value).
+    @param rng: The random generator. If None, the global random generator is used.
+    @return: The output of the oracle.
+    """
+    rng = rng or random
+    moves = _allowed_moves(board, taboo)
+    if not moves:
+        return 'Error: could not find a greedy move.' if greedy else 'Error: could not find a legal move.'
+    if greedy:
+        scores = [board.move_reward(i, j) for (i, j, value) in moves]
+        best_score = max(scores)
+        moves = [move for move, score in zip(moves, scores) if score == best_score]
+    i, j, value = rng.choice(moves)
+    return f'Generated move ({board.rc2f(i, j)},{value}).'
+
+
+def run_oracle(board: SudokuBoard, options: str = '', rng: Optional[random.Random] = None) -> str:
+    """
+    Runs the oracle on a board. The supported options are the ones of the solve_sudoku program: --move "k value",
+    --random, --greedy and --taboo="i j value ...". Without options, the solvability of the board is reported.
+    @param board: A sudoku board. It is not modified.
+    @param options: Command line options of solve_sudoku.
+    @param rng: The random generator used for --random and --greedy.
+    @return: The output of the oracle, in the same format as solve_sudoku.
+    """
+    move = None
+    mode = None
+    taboo = set()
+    words = shlex.split(options)
+    index = 0
+    while index < len(words):
+        word = words[index]
+        if word in ('--move', '--taboo') and index + 1 < len(words):
+            word = f'{word}={words[index + 1]}'
+            index += 1
+        if word.startswith('--move='):
+            move = word[len('--move='):]
+        elif word.startswith('--taboo='):
+            taboo = _taboo_triples(word[len('--taboo='):])
+        elif word in ('--random', '--greedy'):
+            mode = word
+        else:
+            raise RuntimeError(f'Unknown option "{word}"')
+        index += 1
+
+    if move is not None:
+        try:
+            k, value = (int(word) for word in move.split())
+        except ValueError:
+            return f"Could not parse a move from '{move}'."
+        return check_move(board, k, value)
+    if mode is not None:
+        return generate_move(board, mode == '--greedy', taboo, rng)
+    return 'The sudoku has a solution.' if has_solution(board) else 'The sudoku has no solution.'
+
+
+def solve_sudoku(board_text: str, options: str = '') -> str:
+    """
+    An in-process replacement of the solve_sudoku program.
+    @param board_text: A string representation of a sudoku board.
+    @param options: Command line options of solve_sudoku.
+    @return: The output of solve_sudoku.
+    """
+    return run_oracle(load_sudoku_from_text(board_text), options)
+
+
+def serve(input_stream=sys.stdin, output_stream=sys.stdout) -> None:
+    """
+    Answers oracle queries using the line protocol of competitive_sudoku.execute.OracleProcess, until the input is
+    closed.
+    @param input_stream: The stream from which requests are read.
+    @param output_stream: The stream to which responses are written.
+    """
+    for line in input_stream:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            output = solve_sudoku(request['board'], request.get('options', ''))
+        except Exception as err:
+            # a malformed request must not stop the server, since the client depends on it for all later queries
+            output = f'Error: {err}'
+        output_stream.write(json.dumps({'output': output}) + '\n')
+        output_stream.flush()
+
+
+def main():
+    import argparse
+    cmdline_parser = argparse.ArgumentParser(description='In-process replacement of the solve_sudoku program.')
+    cmdline_parser.add_argument('--serve', help='answer queries over stdin/stdout using a line protocol', action='store_true')
+    cmdline_parser.add_argument('board', metavar='FILE', nargs='?', help='a text file containing a sudoku')
+    cmdline_parser.add_argument('options', nargs=argparse.REMAINDER, help='options of solve_sudoku')
+    args = cmdline_parser.parse_args()
+    if args.serve:
+        serve()
+    elif args.board:
+        from pathlib import Path
+        print(solve_sudoku(Path(args.board).read_text(), ' '.join(shlex.quote(option) for option in args.options)))
+    else:
+        cmdline_parser.print_usage()
+
+
+if __name__ == '__main__':
+    main()
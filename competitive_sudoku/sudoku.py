@@ -2,29 +2,69 @@
 #  Software License, (See accompanying file LICENSE or copy at
 #  https://www.gnu.org/licenses/gpl-3.0.txt)
 
-from typing import List, Tuple, Union
+from array import array
+from operator import itemgetter
+from typing import Iterator, List, Tuple, Union
 
 
-class Move(object):
+# The reward of a move that completes 0, 1, 2 or 3 units (a row, a column and/or a region)
+REWARDS = (0, 1, 3, 7)
+
+_tuple_new = tuple.__new__
+
+
+class Move(tuple):
     """A Move is a tuple (i, j, value) that represents the action board.put(i, j, value) for a given
-    sudoku configuration board."""
+    sudoku configuration board. Moves are immutable and hashable."""
 
-    def __init__(self, i: int, j: int, value: int):
+    __slots__ = ()
+
+    def __new__(cls, i: int, j: int, value: int):
         """
         Constructs a move.
         @param i: A row value in the range [0, ..., N)
         @param j: A column value in the range [0, ..., N)
         @param value: A value in the range [1, ..., N]
         """
-        self.i = i
-        self.j = j
-        self.value = value
+        return _tuple_new(cls, (i, j, value))
+
+    i = property(itemgetter(0), doc='The row of the move.')
+    j = property(itemgetter(1), doc='The column of the move.')
+    value = property(itemgetter(2), doc='The value of the move.')
 
     def __str__(self):
         return f'({self.i},{self.j}) -> {self.value}'
 
-    def __eq__(self, other):
-        return (self.i, self.j, self.value) == (other.i, other.j, other.value)
+    def __reduce__(self):
+        return self.__class__, tuple(self)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def to_int(self, N: int) -> int:
+        """
+        Encodes the move as a single integer k * (N + 1) + value, with k = N * i + j the index of the square in the
+        board array. The encoding fits in an unsigned 32-bit integer for all supported board sizes, so sequences of
+        moves can be stored in an array('I').
+        @param N: The size N = m * n of the board.
+        @return: The encoded move.
+        """
+        return (N * self.i + self.j) * (N + 1) + self.value
+
+    @classmethod
+    def from_int(cls, code: int, N: int):
+        """
+        Decodes a move that was encoded using to_int.
+        @param code: An encoded move.
+        @param N: The size N = m * n of the board.
+        @return: The decoded move.
+        """
+        k, value = divmod(code, N + 1)
+        i, j = divmod(k, N)
+        return cls(i, j, value)
 
 
 class TabooMove(Move):
@@ -32,14 +72,179 @@ class TabooMove(Move):
     move would cause the sudoku to become unsolvable.
     """
 
+    __slots__ = ()
+
+
+class TabooList(list):
+    """
+    A list of taboo moves with an index for constant time membership tests. For every square that has taboo moves,
+    the index contains a bitmask in which bit (v - 1) is set if value v is taboo on that square. If a geometry is
+    given, the list also maintains the Zobrist hash of the set of taboo moves.
+    """
+
+    def __init__(self, moves=(), geometry: 'SudokuGeometry' = None):
+        """
+        Constructs a list of taboo moves.
+        @param moves: The initial taboo moves.
+        @param geometry: The geometry of the board, used for computing the Zobrist hash.
+        """
+        super().__init__(moves)
+        self.geometry = geometry
+        self._rebuild_index()
+
+    def _add_to_index(self, move) -> None:
+        key = (move.i, move.j)
+        mask = self.masks.get(key, 0)
+        bit = 1 << (move.value - 1)
+        if not mask & bit:
+            self.masks[key] = mask | bit
+            if self.geometry:
+                self.zobrist ^= self.geometry.taboo_key(move.i, move.j, move.value)
+
+    def _rebuild_index(self) -> None:
+        self.masks = {}
+        self.zobrist = 0
+        for move in self:
+            self._add_to_index(move)
+
+    def set_geometry(self, geometry: 'SudokuGeometry') -> None:
+        """
+        Sets the geometry of the board, and recomputes the Zobrist hash.
+        @param geometry: The geometry of the board.
+        """
+        self.geometry = geometry
+        self._rebuild_index()
+
+    def taboo_mask(self, i: int, j: int) -> int:
+        """
+        Gets the taboo values of the square with coordinates (i, j).
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @return: A bitmask in which bit (v - 1) is set if value v is taboo on the square.
+        """
+        return self.masks.get((i, j), 0)
+
+    def __contains__(self, move) -> bool:
+        mask = self.masks.get((move.i, move.j))
+        return mask is not None and move.value > 0 and bool(mask >> (move.value - 1) & 1)
+
+    def append(self, move) -> None:
+        super().append(move)
+        self._add_to_index(move)
+
+    def extend(self, moves) -> None:
+        moves = list(moves)
+        super().extend(moves)
+        for move in moves:
+            self._add_to_index(move)
+
+    def insert(self, index, move) -> None:
+        super().insert(index, move)
+        self._add_to_index(move)
+
+    def __iadd__(self, moves):
+        self.extend(moves)
+        return self
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self._rebuild_index()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._rebuild_index()
+
+    def pop(self, index=-1):
+        move = super().pop(index)
+        self._rebuild_index()
+        return move
+
+    def remove(self, move) -> None:
+        super().remove(move)
+        self._rebuild_index()
+
+    def clear(self) -> None:
+        super().clear()
+        self.masks = {}
+        self.zobrist = 0
+
+    def __reduce__(self):
+        return self.__class__, (list(self), self.geometry)
+
+
+class SudokuGeometry(object):
+    """
+    Lookup tables for the squares and units (rows, columns and regions) of a board with blocks of size m x n. Squares
+    are identified by their index k = N * i + j in the board array, and regions are numbered row by row, starting
+    with 0 in the top left corner. Use get_geometry to obtain the shared instance for given m and n.
+    """
+
+    def __init__(self, m: int, n: int):
+        """
+        Computes the lookup tables for boards with blocks of size m x n.
+        @param m: The number of rows in a block.
+        @param n: The number of columns in a block.
+        """
+        N = m * n
+        self.m = m
+        self.n = n
+        self.N = N
+        squares = range(N * N)
+
+        # square k -> the index of its row, column and region
+        self.square_rows = tuple(k // N for k in squares)
+        self.square_columns = tuple(k % N for k in squares)
+        self.square_regions = tuple((k // N // m) * m + k % N // n for k in squares)
+        self.square_units = tuple(zip(self.square_rows, self.square_columns, self.square_regions))
+
+        # unit -> the squares it contains
+        self.row_squares = tuple(tuple(N * i + j for j in range(N)) for i in range(N))
+        self.column_squares = tuple(tuple(N * i + j for i in range(N)) for j in range(N))
+        self.region_squares = tuple(tuple(k for k in squares if self.square_regions[k] == r) for r in range(N))
+        self.units = self.row_squares + self.column_squares + self.region_squares
+
+        # square k -> the other squares in its row, column and region
+        self.peers = tuple(
+            tuple(sorted(set(self.row_squares[i] + self.column_squares[j] + self.region_squares[r]) - {k}))
+            for k, (i, j, r) in enumerate(self.square_units))
+
+        # Zobrist keys, indexed by k * (N + 1) + value. The keys of empty squares are 0. The random generator is
+        # seeded with the geometry, such that hashes are reproducible between runs and processes.
+        import random
+        rng = random.Random(f'zobrist {m}x{n}')
+        self.square_keys = tuple(rng.getrandbits(64) if value else 0 for k in squares for value in range(N + 1))
+        self.taboo_keys = tuple(rng.getrandbits(64) if value else 0 for k in squares for value in range(N + 1))
+        self.side_key = rng.getrandbits(64)  # included if it is the turn of the second player
+
+    def taboo_key(self, i: int, j: int, value: int) -> int:
+        """
+        Gets the Zobrist key of the taboo move (i, j, value).
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @param value: A value in the range [1, ..., N]
+        @return: A 64-bit key.
+        """
+        N = self.N
+        return self.taboo_keys[(N * i + j) * (N + 1) + value]
+
+    def __reduce__(self):
+        return get_geometry, (self.m, self.n)
+
+
+_geometries = {}
+
+
+def get_geometry(m: int, n: int) -> SudokuGeometry:
     """
-    Constructs a taboo move.
-    @param i: A row value in the range [0, ..., N)
-    @param j: A column value in the range [0, ..., N)
-    @param value: A value in the range [1, ..., N]
+    Gets the lookup tables for boards with blocks of size m x n. The tables are computed once and then cached.
+    @param m: The number of rows in a block.
+    @param n: The number of columns in a block.
+    @return: The geometry of the board.
     """
-    def __init__(self, i: int, j: int, value: int):
-        super().__init__(i, j, value)
+    geometry = _geometries.get((m, n))
+    if geometry is None:
+        geometry = _geometries[(m, n)] = SudokuGeometry(m, n)
+    return geometry
 
 
 class SudokuBoard(object):
@@ -59,7 +264,88 @@ class SudokuBoard(object):
         self.m = m
         self.n = n
         self.N = N     # N = m * n, numbers are in the range [1, ..., N]
-        self.squares = [SudokuBoard.empty] * (N * N)  # The N*N squares of the board
+        # The N*N squares of the board, stored as one byte per square (two bytes if N > 255)
+        self.squares = array(SudokuBoard.typecode(N), [SudokuBoard.empty]) * (N * N)
+        # Bitmasks of the values used in each row, column and region. Value v corresponds to bit (v - 1).
+        self.row_masks = [0] * N
+        self.column_masks = [0] * N
+        self.region_masks = [0] * N
+        self.full_mask = (1 << N) - 1
+        # The number of empty squares in each row, column and region
+        self.row_empty = [N] * N
+        self.column_empty = [N] * N
+        self.region_empty = [N] * N
+        self.geometry = get_geometry(m, n)
+        self.zobrist = 0  # The Zobrist hash of the squares, updated by put
+
+    @classmethod
+    def from_squares(cls, m: int, n: int, squares: array) -> 'SudokuBoard':
+        """
+        Constructs a board from the values of its squares. The bitmasks, counters and the Zobrist hash are computed
+        in a single pass, which is much cheaper than calling put for every square.
+        @param m: The number of rows in a block.
+        @param n: The number of columns in a block.
+        @param squares: An array with typecode SudokuBoard.typecode(m * n) containing the N*N values. It becomes the
+        storage of the board, and is not copied.
+        @return: The generated Sudoku board.
+        """
+        result = cls(m, n)
+        N = result.N
+        row_masks = result.row_masks
+        column_masks = result.column_masks
+        region_masks = result.region_masks
+        row_empty = result.row_empty
+        column_empty = result.column_empty
+        region_empty = result.region_empty
+        square_units = result.geometry.square_units
+        square_keys = result.geometry.square_keys
+        zobrist = 0
+        for k, value in enumerate(squares):
+            if value != SudokuBoard.empty:
+                i, j, r = square_units[k]
+                bit = 1 << (value - 1)
+                row_masks[i] |= bit
+                column_masks[j] |= bit
+                region_masks[r] |= bit
+                row_empty[i] -= 1
+                column_empty[j] -= 1
+                region_empty[r] -= 1
+                zobrist ^= square_keys[k * (N + 1) + value]
+        result.squares = squares
+        result.zobrist = zobrist
+        return result
+
+    @staticmethod
+    def typecode(N: int) -> str:
+        """
+        Gets the array typecode that is used to store the squares of a board with values in the range [1, ..., N].
+        @param N: The size N = m * n of the board.
+        @return: The typecode 'B' if N fits in a byte, and 'H' otherwise.
+        """
+        return 'B' if N <= 255 else 'H'
+
+    def clone(self) -> 'SudokuBoard':
+        """
+        Creates a copy of the board. The squares are copied as a single buffer, which is much cheaper than
+        copy.deepcopy.
+        @return: An independent copy of the board.
+        """
+        result = self.__class__.__new__(self.__class__)
+        result.__dict__.update(self.__dict__)
+        result.squares = self.squares[:]
+        result.row_masks = self.row_masks[:]
+        result.column_masks = self.column_masks[:]
+        result.region_masks = self.region_masks[:]
+        result.row_empty = self.row_empty[:]
+        result.column_empty = self.column_empty[:]
+        result.region_empty = self.region_empty[:]
+        return result
+
+    def __copy__(self) -> 'SudokuBoard':
+        return self.clone()
+
+    def __deepcopy__(self, memo) -> 'SudokuBoard':
+        return self.clone()
 
     def rc2f(self, i: int, j: int):
         """
@@ -82,14 +368,49 @@ class SudokuBoard(object):
         j = k % N
         return i, j
 
+    def region_index(self, i: int, j: int) -> int:
+        """
+        Computes the index of the region that contains the square with coordinates (i, j). Regions are numbered
+        row by row, starting with 0 in the top left corner.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @return: The corresponding region index in the range [0, ..., N)
+        """
+        return self.geometry.square_regions[self.N * i + j]
+
     def put(self, i: int, j: int, value: int) -> None:
         """
-        Puts the given value on the square with coordinates (i, j).
+        Puts the given value on the square with coordinates (i, j). The used-value bitmasks and the empty square
+        counts of the row, column and region of the square, and the Zobrist hash are updated accordingly. Putting
+        SudokuBoard.empty clears the square.
+        N.B. The bitmasks assume that a value occurs at most once in every row, column and region.
         @param i: A row value in the range [0, ..., N)
         @param j: A column value in the range [0, ..., N)
-        @param value: A value in the range [1, ..., N]
+        @param value: A value in the range [0, ..., N]
         """
-        k = self.rc2f(i, j)
+        k = self.N * i + j
+        r = self.geometry.square_regions[k]
+        old_value = self.squares[k]
+        if old_value != SudokuBoard.empty:
+            bit = ~(1 << (old_value - 1))
+            self.row_masks[i] &= bit
+            self.column_masks[j] &= bit
+            self.region_masks[r] &= bit
+            if value == SudokuBoard.empty:
+                self.row_empty[i] += 1
+                self.column_empty[j] += 1
+                self.region_empty[r] += 1
+        if value != SudokuBoard.empty:
+            bit = 1 << (value - 1)
+            self.row_masks[i] |= bit
+            self.column_masks[j] |= bit
+            self.region_masks[r] |= bit
+            if old_value == SudokuBoard.empty:
+                self.row_empty[i] -= 1
+                self.column_empty[j] -= 1
+                self.region_empty[r] -= 1
+        square_keys = self.geometry.square_keys
+        self.zobrist ^= square_keys[k * (self.N + 1) + old_value] ^ square_keys[k * (self.N + 1) + value]
         self.squares[k] = value
 
     def get(self, i: int, j: int):
@@ -102,6 +423,63 @@ class SudokuBoard(object):
         k = self.rc2f(i, j)
         return self.squares[k]
 
+    def move_reward(self, i: int, j: int) -> int:
+        """
+        Computes the reward of putting a value on the empty square with coordinates (i, j) in constant time. The
+        reward only depends on the number of units (row, column and region) that are completed by the move.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @return: The reward 0, 1, 3 or 7.
+        """
+        completed = (self.row_empty[i] == 1) + (self.column_empty[j] == 1) + \
+                    (self.region_empty[self.geometry.square_regions[self.N * i + j]] == 1)
+        return REWARDS[completed]
+
+    def candidates(self, i: int, j: int) -> int:
+        """
+        Gets the values that can be put on the square with coordinates (i, j) without creating a duplicate entry in
+        its row, column or region.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @return: A bitmask in which bit (v - 1) is set if value v is a candidate. It is 0 for non-empty squares.
+        """
+        k = self.N * i + j
+        if self.squares[k] != SudokuBoard.empty:
+            return 0
+        used = self.row_masks[i] | self.column_masks[j] | self.region_masks[self.geometry.square_regions[k]]
+        return ~used & self.full_mask
+
+    def is_legal(self, i: int, j: int, value: int) -> bool:
+        """
+        Checks if the value can be put on the empty square with coordinates (i, j) without creating a duplicate entry.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @param value: A value in the range [1, ..., N]
+        @return: True if the move (i, j, value) respects the row, column and region constraints.
+        """
+        return bool(self.candidates(i, j) >> (value - 1) & 1)
+
+    def legal_moves(self) -> Iterator[Move]:
+        """
+        Generates all moves that put a value on an empty square without creating a duplicate entry in a row,
+        column or region. Taboo moves are not taken into account.
+        @return: An iterator over the legal moves, ordered by square and then by value.
+        """
+        full_mask = self.full_mask
+        row_masks = self.row_masks
+        column_masks = self.column_masks
+        region_masks = self.region_masks
+        square_units = self.geometry.square_units
+        for k, square in enumerate(self.squares):
+            if square != SudokuBoard.empty:
+                continue
+            i, j, r = square_units[k]
+            mask = ~(row_masks[i] | column_masks[j] | region_masks[r]) & full_mask
+            while mask:
+                bit = mask & -mask
+                yield Move(i, j, bit.bit_length())
+                mask ^= bit
+
     def __str__(self) -> str:
         """
         Prints the board in a simple textual format. The first line contains the values m and n. Then the contents of
@@ -148,7 +526,7 @@ def print_board(board: SudokuBoard) -> str:
         if i == 0:
             out.write('  ')
             for j in range(N):
-                out.write(f'   {j + 1}  ')
+                out.write(f'  {j + 1:>2}  ')
             out.write('\n')
             for j in range(N):
                 if j % n != 0:
@@ -216,7 +594,8 @@ def load_sudoku_from_text(text: str) -> SudokuBoard:
         s = words[k + 2]
         if s != '.':
             value = int(s)
-            result.squares[k] = value
+            i, j = result.f2rc(k)
+            result.put(i, j, value)
     return result
 
 
@@ -252,15 +631,237 @@ class GameState(object):
         """
         @param initial_board: A sudoku board. It contains the start position of a game.
         @param board: A sudoku board. It contains the current position of a game.
-        @param taboo_moves: A list of taboo moves. Moves in this list cannot be played.
+        @param taboo_moves: A list of taboo moves. Moves in this list cannot be played. It is stored as a TabooList.
         @param moves: The history of a sudoku game, starting in initial_board.
         @param scores: The current scores of the first and the second player.
         """
         self.initial_board = initial_board
         self.board = board
+        if not isinstance(taboo_moves, TabooList):
+            taboo_moves = TabooList(taboo_moves, board.geometry)
+        elif taboo_moves.geometry is not board.geometry:
+            taboo_moves.set_geometry(board.geometry)
         self.taboo_moves = taboo_moves
         self.moves = moves
         self.scores = scores
+        self.undo_stack: List[int] = []  # The rewards of the moves that were applied using play
+
+    @property
+    def zobrist(self) -> int:
+        """
+        The Zobrist hash of the position, consisting of the squares of the board, the set of taboo moves and the
+        player to move. It is maintained incrementally, so computing it takes constant time.
+        """
+        result = self.board.zobrist ^ self.taboo_moves.zobrist
+        if len(self.moves) % 2:
+            result ^= self.board.geometry.side_key
+        return result
+
+    def current_player(self) -> int:
+        """
+        Gets the index of the player that is to move.
+        @return: 0 if it is the turn of the first player, 1 if it is the turn of the second player.
+        """
+        return len(self.moves) % 2
+
+    def is_taboo(self, i: int, j: int, value: int) -> bool:
+        """
+        Checks if the move (i, j, value) is a taboo move.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @param value: A value in the range [1, ..., N]
+        @return: True if the move is in the list of taboo moves.
+        """
+        return bool(self.taboo_moves.taboo_mask(i, j) >> (value - 1) & 1)
+
+    def legal_moves(self) -> Iterator[Move]:
+        """
+        Generates all moves on the current board that respect the row, column and region constraints and that are
+        not taboo.
+        @return: An iterator over the legal moves, ordered by square and then by value.
+        """
+        taboo_masks = self.taboo_moves.masks
+        if not taboo_masks:
+            yield from self.board.legal_moves()
+            return
+        for move in self.board.legal_moves():
+            mask = taboo_masks.get((move.i, move.j))
+            if mask is None or not mask >> (move.value - 1) & 1:
+                yield move
+
+    def play(self, move: Union[Move, TabooMove]) -> int:
+        """
+        Applies a move of the current player in place. A TabooMove is only added to the move history and the list of
+        taboo moves, other moves are put on the board and their reward is added to the score of the current player.
+        The move is not checked for legality. It can be taken back using undo.
+        @param move: A move.
+        @return: The reward of the move.
+        """
+        player = len(self.moves) % 2
+        if isinstance(move, TabooMove):
+            reward = 0
+            self.taboo_moves.append(move)
+        else:
+            board = self.board
+            reward = board.move_reward(move.i, move.j)
+            board.put(move.i, move.j, move.value)
+            self.scores[player] += reward
+        self.moves.append(move)
+        self.undo_stack.append(reward)
+        return reward
+
+    def undo(self) -> Union[Move, TabooMove]:
+        """
+        Takes back the last move that was applied using play.
+        @return: The move that was taken back.
+        """
+        if not self.undo_stack:
+            raise RuntimeError('There is no move to undo.')
+        reward = self.undo_stack.pop()
+        move = self.moves.pop()
+        if isinstance(move, TabooMove):
+            self.taboo_moves.pop()
+        else:
+            self.board.put(move.i, move.j, SudokuBoard.empty)
+            self.scores[len(self.moves) % 2] -= reward
+        return move
+
+    def __str__(self):
+        import io
+        out = io.StringIO()
+        out.write(print_board(self.board))
+        out.write(f'Score: {self.scores[0]} - {self.scores[1]}')
+        return out.getvalue()
+
+
+class PersistentGameState(object):
+    """
+    An immutable game state that shares its history and board storage with its parent. A state only stores its
+    parent, the last move, and the scores, so creating a child takes constant space. This makes it suitable for
+    building large search trees.
+
+    All states that are derived from the same root share one mutable cursor: a GameState that is moved through the
+    tree using play and undo whenever the board of a state is needed. Moving between nearby states, as in a depth
+    first or breadth first traversal, is therefore cheap.
+    """
+
+    __slots__ = ('parent', 'move', 'reward', 'scores', 'depth', '_cursor')
+
+    def __init__(self, parent: Union['PersistentGameState', None], move: Union[Move, TabooMove, None], reward: int,
+                 scores: Tuple[int, int], depth: int, cursor: '_Cursor'):
+        """
+        Constructs a state. Use from_game_state and child instead of calling this constructor directly.
+        @param parent: The parent state, or None for the root.
+        @param move: The move that leads from the parent to this state, or None for the root.
+        @param reward: The reward of move.
+        @param scores: The scores of the first and the second player.
+        @param depth: The number of moves between the root and this state.
+        @param cursor: The cursor that is shared by all states of the tree.
+        """
+        self.parent = parent
+        self.move = move
+        self.reward = reward
+        self.scores = scores
+        self.depth = depth
+        self._cursor = cursor
+
+    @staticmethod
+    def from_game_state(game_state: GameState) -> 'PersistentGameState':
+        """
+        Creates the root of a tree of persistent states. The game state is copied, so it can be modified afterwards.
+        @param game_state: A game state.
+        @return: A persistent state that is equivalent to game_state.
+        """
+        cursor = _Cursor(game_state)
+        root = PersistentGameState(None, None, 0, tuple(game_state.scores), 0, cursor)
+        cursor.node = root
+        return root
+
+    def child(self, move: Union[Move, TabooMove]) -> 'PersistentGameState':
+        """
+        Creates the state that results from playing the given move. The move is not checked for legality.
+        @param move: A move of the player that is to move in this state.
+        @return: The resulting state.
+        """
+        if isinstance(move, TabooMove):
+            reward = 0
+        else:
+            reward = self._cursor.seek(self).board.move_reward(move.i, move.j)
+        scores = self.scores
+        if reward:
+            player = self.current_player()
+            scores = (scores[0] + reward, scores[1]) if player == 0 else (scores[0], scores[1] + reward)
+        return PersistentGameState(self, move, reward, scores, self.depth + 1, self._cursor)
+
+    def current_player(self) -> int:
+        """
+        Gets the index of the player that is to move.
+        @return: 0 if it is the turn of the first player, 1 if it is the turn of the second player.
+        """
+        return (self._cursor.root_length + self.depth) % 2
+
+    def path(self) -> List[Union[Move, TabooMove]]:
+        """
+        Gets the moves that lead from the root to this state.
+        @return: A list of moves.
+        """
+        result = []
+        node = self
+        while node.parent is not None:
+            result.append(node.move)
+            node = node.parent
+        result.reverse()
+        return result
+
+    @property
+    def initial_board(self) -> SudokuBoard:
+        return self._cursor.state.initial_board
+
+    @property
+    def board(self) -> SudokuBoard:
+        """
+        The board of this state. N.B. The board is shared by all states of the tree: it is only valid until the board
+        of another state is requested, and it must not be modified. Use to_game_state to obtain an independent copy.
+        """
+        return self._cursor.seek(self).board
+
+    @property
+    def moves(self) -> List[Union[Move, TabooMove]]:
+        """
+        The history of the game, starting in the initial board. The list is created on demand.
+        """
+        return self._cursor.root_moves + self.path()
+
+    @property
+    def taboo_moves(self) -> TabooList:
+        """
+        The taboo moves of this state. The list is created on demand.
+        """
+        return TabooList(self._cursor.root_taboo_moves + [move for move in self.path() if isinstance(move, TabooMove)],
+                         self._cursor.state.board.geometry)
+
+    @property
+    def zobrist(self) -> int:
+        """
+        The Zobrist hash of the position, see GameState.zobrist.
+        """
+        return self._cursor.seek(self).zobrist
+
+    def legal_moves(self) -> List[Move]:
+        """
+        Computes the legal moves of this state, see GameState.legal_moves.
+        @return: A list of moves.
+        """
+        return list(self._cursor.seek(self).legal_moves())
+
+    def to_game_state(self) -> GameState:
+        """
+        Creates an independent mutable copy of this state.
+        @return: A game state.
+        """
+        state = self._cursor.seek(self)
+        return GameState(state.initial_board, state.board.clone(), list(state.taboo_moves), list(state.moves),
+                         list(self.scores))
 
     def __str__(self):
         import io
@@ -268,3 +869,46 @@ class GameState(object):
         out.write(print_board(self.board))
         out.write(f'Score: {self.scores[0]} - {self.scores[1]}')
         return out.getvalue()
+
+
+class _Cursor(object):
+    """
+    A mutable game state that can be positioned at any state of a tree of persistent game states.
+    """
+
+    def __init__(self, game_state: GameState):
+        board = game_state.board.clone()
+        self.state = GameState(game_state.initial_board, board, list(game_state.taboo_moves), list(game_state.moves),
+                               list(game_state.scores))
+        self.root_moves = list(game_state.moves)
+        self.root_taboo_moves = list(game_state.taboo_moves)
+        self.root_length = len(game_state.moves)
+        self.node = None
+
+    def seek(self, target: PersistentGameState) -> GameState:
+        """
+        Moves the cursor to the given state, by undoing moves up to the common ancestor of the current position and
+        target, and then playing the moves down to target.
+        @param target: A persistent state of the tree.
+        @return: The game state, positioned at target.
+        """
+        node = self.node
+        if node is target:
+            return self.state
+        self.node = target
+        state = self.state
+        redo = []
+        while node.depth > target.depth:
+            state.undo()
+            node = node.parent
+        while target.depth > node.depth:
+            redo.append(target.move)
+            target = target.parent
+        while node is not target:
+            state.undo()
+            node = node.parent
+            redo.append(target.move)
+            target = target.parent
+        for move in reversed(redo):
+            state.play(move)
+        return state
@@ -2,9 +2,77 @@
 #  Software License, (See accompanying file LICENSE or copy at
 #  https://www.gnu.org/licenses/gpl-3.0.txt)
 
-from typing import List
+import ctypes
+import multiprocessing
+import signal
+from typing import List, Tuple
 from competitive_sudoku.sudoku import GameState, Move
 
+# The signal that is used to interrupt a computation in a persistent worker process (see competitive_sudoku.worker).
+# It is not available on Windows.
+INTERRUPT_SIGNAL = getattr(signal, 'SIGUSR1', None)
+
+
+class MoveInterrupted(BaseException):
+    """
+    Raised inside compute_best_move when the time or the node budget for a move is spent. It derives from
+    BaseException, such that 'except Exception' clauses in an AI do not catch it.
+    """
+
+
+class MoveSlot(object):
+    """
+    A slot in shared memory that holds the best move proposed by an AI, together with the number of proposals. It
+    consists of three unsigned 64-bit words: a sequence number, the packed move (i << 40) | (j << 20) | value, and
+    the proposal counter. The slot has a single writer, and is protected by a seqlock: the writer makes the sequence
+    number odd, updates the move and the counter, and makes it even again. A reader retries until it sees the same
+    even sequence number before and after reading. So proposing a move does not need a lock or a manager process.
+
+    If the writer is killed in the middle of a write, the sequence number stays odd. Since the move is a single
+    aligned word, it is never torn, so after a number of retries the reader simply takes it.
+    """
+
+    def __init__(self):
+        self.words = multiprocessing.RawArray(ctypes.c_uint64, 3)  # sequence number, move, proposals
+
+    def write(self, i: int, j: int, value: int) -> None:
+        """
+        Stores a move, and increments the proposal counter.
+        @param i: A row value in the range [0, ..., N)
+        @param j: A column value in the range [0, ..., N)
+        @param value: A value in the range [1, ..., N]
+        """
+        words = self.words
+        sequence = words[0] | 1  # an odd sequence number is left behind by an interrupted write
+        words[0] = sequence
+        words[1] = (i << 40) | (j << 20) | value
+        words[2] += 1
+        words[0] = sequence + 1
+
+    def read(self, retries: int = 1000) -> Tuple[int, int, int, int]:
+        """
+        Reads the slot.
+        @param retries: The number of attempts to get a consistent snapshot.
+        @return: The tuple (i, j, value, proposals). It is (0, 0, 0, 0) if no move was proposed.
+        """
+        words = self.words
+        for _ in range(retries):
+            sequence = words[0]
+            move = words[1]
+            proposals = words[2]
+            if sequence % 2 == 0 and words[0] == sequence:
+                break
+        mask = (1 << 20) - 1
+        return move >> 40, (move >> 20) & mask, move & mask, proposals
+
+    def reset(self) -> None:
+        """
+        Clears the move and the proposal counter. It should only be called while there is no writer.
+        """
+        self.words[1] = 0
+        self.words[2] = 0
+        self.words[0] = 0
+
 
 class SudokuAI(object):
     """
@@ -12,29 +80,76 @@ class SudokuAI(object):
     """
 
     def __init__(self):
-        self.best_move: List[int] = [0, 0, 0]
-        self.lock = None
+        self.best_move: List[int] = [0, 0, 0]  # a MoveSlot if the AI runs in a separate process
+        self.lock = None  # only used if best_move is a list, see propose_move
+        # A multiprocessing.Semaphore that is released when the AI has finished computing a move, set by the game
+        # playing framework. A semaphore is used instead of an Event, since releasing it is a single atomic operation
+        # that cannot leave a lock behind if the process is killed.
+        self.finished = None
+        # The number of nodes reported with tick during the current move, and the maximum number of nodes per move
+        # if the game is played with a node budget instead of a time limit.
+        self.nodes = 0
+        self.node_budget = None
 
     def compute_best_move(self, game_state: GameState) -> None:
         """
         This function should compute the best move in game_state.board. It should report the best move by making one
         or more calls to propose_move. This function is run by a game playing framework in a separate thread, that will
-        be killed after a specific amount of time. The last reported move is the one that will be played.
+        be killed after a specific amount of time. The last reported move is the one that will be played. If the
+        function returns, or if it calls finish, the framework does not wait for the time to run out.
         @param game_state: A Game state.
         """
         raise NotImplementedError
 
+    def finish(self) -> None:
+        """
+        Signals that the best move has been proposed, e.g. because it is provably optimal, such that the game can
+        continue without waiting for the time to run out. The computation is stopped shortly afterwards.
+        """
+        if self.finished is not None:
+            self.finished.release()
+
+    def tick(self, nodes: int = 1) -> None:
+        """
+        Reports that the AI has done some work, e.g. that it has expanded a node of its search tree. If the game is
+        played with a node budget, the computation is stopped by raising MoveInterrupted as soon as the budget is
+        spent. Otherwise the nodes are only counted. An AI that never calls tick is only stopped by the wall-clock
+        safety limit of the game, so its moves are then not reproducible.
+        @param nodes: The amount of work, in nodes.
+        """
+        self.nodes += nodes
+        if self.node_budget is not None and self.nodes > self.node_budget:
+            raise MoveInterrupted()
+
+    def compute_and_finish(self, game_state: GameState) -> None:
+        """
+        Runs compute_best_move, and signals completion when it returns. This is the function that the game playing
+        framework runs.
+        @param game_state: A Game state.
+        """
+        self.nodes = 0
+        try:
+            self.compute_best_move(game_state)
+        finally:
+            self.finish()
+
     def propose_move(self, move: Move) -> None:
         """
-        Updates the best move that has been found so far.
-        N.B. DO NOT CHANGE THIS FUNCTION!
+        Updates the best move that has been found so far. The game playing framework of simulate_game always installs
+        a MoveSlot as best_move, which is written without a lock. A caller outside the framework can instead use a
+        list of three values, optionally protected by a lock that it assigns to the lock attribute.
         @param move: A move.
         """
         i, j, value = move.i, move.j, move.value
+        if isinstance(self.best_move, MoveSlot):
+            self.best_move.write(i, j, value)
+            return
         if self.lock:
             self.lock.acquire()
-        self.best_move[0] = i
-        self.best_move[1] = j
-        self.best_move[2] = value
-        if self.lock:
-            self.lock.release()
+        try:
+            self.best_move[0] = i
+            self.best_move[1] = j
+            self.best_move[2] = value
+        finally:
+            if self.lock:
+                self.lock.release()
@@ -0,0 +1,128 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Batched move generation and scoring for a whole ply. If NumPy is installed, the computations are vectorized,
+# otherwise an equivalent pure python implementation is used.
+
+from typing import List, Tuple
+from competitive_sudoku.sudoku import GameState, Move, SudokuBoard, REWARDS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HAVE_NUMPY = np is not None
+
+
+def _square_array(board: SudokuBoard):
+    """
+    Views the squares of a board as an N x N NumPy array, without copying them.
+    """
+    N = board.N
+    return np.frombuffer(board.squares, dtype=np.dtype(board.squares.typecode)).reshape(N, N)
+
+
+def _expand_regions(region_values, m: int, n: int):
+    """
+    Expands an array indexed by (region row, region column, ...) to an array indexed by (row, column, ...).
+    """
+    return np.repeat(np.repeat(region_values, m, axis=0), n, axis=1)
+
+
+def candidate_tensor(game_state: GameState, use_numpy: bool = HAVE_NUMPY):
+    """
+    Computes for every square and every value whether putting the value on the square is a legal move, i.e. the
+    square is empty, the row, column and region constraints are respected and the move is not taboo.
+    @param game_state: A game state.
+    @param use_numpy: If True, NumPy is used, otherwise nested lists are computed in pure python.
+    @return: An N x N x N boolean array (nested lists if use_numpy is False), such that element [i][j][value - 1] is
+    True if the move (i, j, value) is legal.
+    """
+    board = game_state.board
+    m, n, N = board.m, board.n, board.N
+
+    if not use_numpy:
+        taboo_mask = game_state.taboo_moves.taboo_mask
+        result = []
+        for i in range(N):
+            row = []
+            for j in range(N):
+                mask = board.candidates(i, j) & ~taboo_mask(i, j)
+                row.append([bool(mask >> v & 1) for v in range(N)])
+            result.append(row)
+        return result
+
+    squares = _square_array(board)
+    filled = np.zeros((N, N, N + 1), dtype=bool)
+    rows, columns = np.indices((N, N))
+    filled[rows, columns, squares] = True
+    filled = filled[:, :, 1:]  # filled[i, j, v - 1] is True if square (i, j) contains value v
+
+    row_used = filled.any(axis=1)     # [i, v - 1]
+    column_used = filled.any(axis=0)  # [j, v - 1]
+    region_used = filled.reshape(n, m, m, n, N).any(axis=(1, 3))  # [region row, region column, v - 1]
+
+    result = (squares == SudokuBoard.empty)[:, :, None] & ~row_used[:, None, :] & ~column_used[None, :, :] \
+        & ~_expand_regions(region_used, m, n)
+    if game_state.taboo_moves:
+        taboo = np.array([(move.i, move.j, move.value - 1) for move in game_state.taboo_moves], dtype=np.intp)
+        result[taboo[:, 0], taboo[:, 1], taboo[:, 2]] = False
+    return result
+
+
+def reward_matrix(board: SudokuBoard, use_numpy: bool = HAVE_NUMPY):
+    """
+    Computes the reward of filling each empty square of the board, based on the number of empty squares in its row,
+    column and region.
+    @param board: A sudoku board.
+    @param use_numpy: If True, NumPy is used, otherwise nested lists are computed in pure python.
+    @return: An N x N integer array (nested lists if use_numpy is False) with the rewards. Non-empty squares have
+    reward 0.
+    """
+    m, n, N = board.m, board.n, board.N
+
+    if not use_numpy:
+        return [[board.move_reward(i, j) if board.get(i, j) == SudokuBoard.empty else 0 for j in range(N)]
+                for i in range(N)]
+
+    empty = _square_array(board) == SudokuBoard.empty
+    row_empty = empty.sum(axis=1)
+    column_empty = empty.sum(axis=0)
+    region_empty = _expand_regions(empty.reshape(n, m, m, n).sum(axis=(1, 3)), m, n)
+    completed = (row_empty[:, None] == 1).astype(np.intp) + (column_empty[None, :] == 1) + (region_empty == 1)
+    return np.asarray(REWARDS)[completed] * empty
+
+
+def legal_moves(game_state: GameState, use_numpy: bool = HAVE_NUMPY) -> List[Move]:
+    """
+    Generates all legal moves of a ply in one batch.
+    @param game_state: A game state.
+    @param use_numpy: If True, NumPy is used, otherwise the moves are generated in pure python.
+    @return: The legal moves, ordered by square and then by value.
+    """
+    if not use_numpy:
+        return list(game_state.legal_moves())
+    rows, columns, values = np.nonzero(candidate_tensor(game_state))
+    return [Move(i, j, value + 1) for i, j, value in zip(rows.tolist(), columns.tolist(), values.tolist())]
+
+
+def scored_moves(game_state: GameState, use_numpy: bool = HAVE_NUMPY) -> List[Tuple[Move, int]]:
+    """
+    Generates all legal moves of a ply together with their rewards, ordered by decreasing reward. This is useful for
+    move ordering at the root of a search.
+    @param game_state: A game state.
+    @param use_numpy: If True, NumPy is used, otherwise the moves are generated in pure python.
+    @return: A list of pairs (move, reward).
+    """
+    if not use_numpy:
+        board = game_state.board
+        result = [(move, board.move_reward(move.i, move.j)) for move in game_state.legal_moves()]
+    else:
+        rows, columns, values = np.nonzero(candidate_tensor(game_state))
+        rewards = reward_matrix(game_state.board)[rows, columns]
+        result = [(Move(i, j, value + 1), reward) for i, j, value, reward in
+                  zip(rows.tolist(), columns.tolist(), values.tolist(), rewards.tolist())]
+    result.sort(key=lambda item: -item[1])
+    return result
@@ -0,0 +1,157 @@
+#  (C) Copyright Wieger Wesselink 2021. Distributed under the GPL-3.0-or-later
+#  Software License, (See accompanying file LICENSE or copy at
+#  https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Long-lived worker processes that run the compute_best_move function of a SudokuAI for a whole game.
+
+import copy
+import multiprocessing
+import os
+import signal
+import sys
+import traceback
+from competitive_sudoku.sudoku import GameState, TabooMove
+from competitive_sudoku.sudokuai import INTERRUPT_SIGNAL, MoveInterrupted, SudokuAI
+
+
+def _apply_moves(game_state: GameState, moves, scores) -> None:
+    """
+    Brings a game state up to date with the moves that were played since the last update.
+    """
+    for move in moves:
+        if isinstance(move, TabooMove):
+            game_state.taboo_moves.append(move)
+        else:
+            game_state.board.put(move.i, move.j, move.value)
+        game_state.moves.append(move)
+    game_state.scores = list(scores)
+
+
+def _run_worker(connection, player: SudokuAI, game_state: GameState) -> None:
+    """
+    The main loop of a worker process. It receives ('move', moves, scores) messages, updates its game state, and
+    runs compute_best_move on a copy of it until it returns or is interrupted. Then it replies 'done'. Completion
+    is also signalled with the finished semaphore of the player.
+    """
+    computing = [False]
+
+    def interrupt(signum, frame):
+        if computing[0]:
+            raise MoveInterrupted()
+
+    signal.signal(INTERRUPT_SIGNAL, interrupt)
+    while True:
+        message = connection.recv()
+        if message[0] == 'stop':
+            return
+        _, moves, scores = message
+        _apply_moves(game_state, moves, scores)
+        try:
+            computing[0] = True
+            try:
+                # the AI may modify the state, which could leave it inconsistent if it is interrupted
+                player.compute_and_finish(copy.deepcopy(game_state))
+            finally:
+                computing[0] = False
+        except MoveInterrupted:
+            pass
+        except Exception:
+            print('Error: an exception occurred.', file=sys.stderr)
+            traceback.print_exc()
+        connection.send('done')
+
+
+class PlayerWorker(object):
+    """
+    Runs the compute_best_move function of a SudokuAI in one process for the whole game, instead of in a new process
+    for every move. Only the moves that were played since the previous turn are sent to the process, and when the
+    time for a move is up the computation is interrupted instead of killed. This means that an AI can keep data,
+    like transposition tables or search trees, in its attributes between moves.
+
+    A computation is interrupted by raising MoveInterrupted in the worker from a handler of INTERRUPT_SIGNAL, which
+    requires POSIX signals. An interrupt can arrive at any point, but propose_move writes the MoveSlot with a seqlock,
+    so the last proposed move is never torn. If the AI does not stop within a grace period, the process is killed
+    and a new one is started for the next move.
+    """
+
+    def __init__(self, player: SudokuAI, game_state: GameState, grace_time: float = 1.0):
+        """
+        Starts a worker process.
+        @param player: A sudoku AI. It is copied to the worker process. Its best_move attribute must be a MoveSlot,
+        such that its proposals are visible outside the worker.
+        @param game_state: The state of the game when the worker is started.
+        @param grace_time: The time in seconds that an interrupted AI gets to stop.
+        """
+        if INTERRUPT_SIGNAL is None:
+            raise RuntimeError('Persistent worker processes are not supported on this platform.')
+        self.player = player
+        self.grace_time = grace_time
+        self.connection = None
+        self.process = None
+        self.sent_moves = 0  # the number of moves of the game that the worker knows about
+        self._start(game_state)
+
+    def _start(self, game_state: GameState) -> None:
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_run_worker, args=(child_connection, self.player, game_state),
+                                               daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.sent_moves = len(game_state.moves)
+
+    def compute_best_move(self, game_state: GameState) -> None:
+        """
+        Starts the computation of a move in game_state, which must be a continuation of the previous state that was
+        sent to the worker. It returns immediately.
+        @param game_state: The current state of the game.
+        """
+        if not self.process.is_alive():
+            self._start(game_state)
+        moves = game_state.moves[self.sent_moves:]
+        self.sent_moves = len(game_state.moves)
+        self.connection.send(('move', moves, list(game_state.scores)))
+
+    def interrupt(self) -> None:
+        """
+        Asks the worker to stop the current computation.
+        """
+        if self.process.is_alive():
+            os.kill(self.process.pid, INTERRUPT_SIGNAL)
+
+    def wait(self, game_state: GameState) -> bool:
+        """
+        Waits until the worker has finished the current computation. If it does not finish within the grace period,
+        the process is killed and replaced by a new one, that starts in game_state.
+        @param game_state: The current state of the game.
+        @return: True if the worker finished in time.
+        """
+        try:
+            if self.connection.poll(self.grace_time):
+                self.connection.recv()
+                return True
+        except (EOFError, OSError):
+            pass
+        self.process.kill()
+        self.process.join()
+        self._start(game_state)
+        return False
+
+    def close(self) -> None:
+        """
+        Stops the worker process.
+        """
+        try:
+            self.connection.send(('stop',))
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(self.grace_time)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -3,7 +3,7 @@
 #  https://www.gnu.org/licenses/gpl-3.0.txt)
 
 import re
-from competitive_sudoku.execute import solve_sudoku
+from competitive_sudoku.execute import cached_solve_sudoku
 from competitive_sudoku.sudoku import GameState, Move
 import competitive_sudoku.sudokuai
 
@@ -25,7 +25,7 @@ class SudokuAI(competitive_sudoku.sudokuai.SudokuAI):
         taboo_moves = ' '.join(f'{move.i} {move.j} {move.value}' for move in game_state.taboo_moves)
         if taboo_moves:
             options += f' --taboo="{taboo_moves}"'
-        output = solve_sudoku(self.solve_sudoku_path, board_text, options)
+        output = cached_solve_sudoku(self.solve_sudoku_path, board_text, options)
         m = re.search(r"Generated move \((\d+),(\d+)\)", output)
         if not m:
             raise RuntimeError('Could not generate a greedy move:\n' + output)
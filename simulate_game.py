@@ -5,119 +5,308 @@
 #  https://www.gnu.org/licenses/gpl-3.0.txt)
 
 import argparse
+import contextlib
 import importlib
+import json
 import multiprocessing
+import os
 import platform
+import random
 import re
+import signal
+import sys
+import threading
 import time
 from pathlib import Path
-from competitive_sudoku.execute import solve_sudoku
+from typing import Optional, TextIO
+from competitive_sudoku.execute import ORACLE_CACHE_VARIABLE, OracleCache, OracleProcess, cached_solve_sudoku, solve_sudoku
+from competitive_sudoku.matching import HallChecker
+from competitive_sudoku.solver import LARGE_BOARD_MIN_FILL, SolutionPool, check_move, generate_move
 from competitive_sudoku.sudoku import GameState, SudokuBoard, Move, TabooMove, load_sudoku_from_text
-from competitive_sudoku.sudokuai import SudokuAI
+from competitive_sudoku.sudokuai import MoveInterrupted, MoveSlot, SudokuAI
+from competitive_sudoku.worker import PlayerWorker
 
 
-def check_oracle(solve_sudoku_path: str) -> None:
+def check_oracle(solve_sudoku_path: Optional[str]) -> None:
     board_text = '''2 2
        1   2   3   4
        3   4   .   2
        2   1   .   3
        .   .   .   1
     '''
+    if solve_sudoku_path is None:
+        name = 'The in-process python oracle'
+        print('No solve_sudoku program is used, checking the in-process python oracle.')
+    else:
+        name = 'The sudoku_solve program'
+        print(f'Checking the solve_sudoku program at {solve_sudoku_path}.')
     output = solve_sudoku(solve_sudoku_path, board_text)
     result = 'has a solution' in output
     if result:
-        print('The sudoku_solve program works.')
+        print(f'{name} works.')
     else:
-        print('The sudoku_solve program gives unexpected results.')
+        print(f'{name} gives unexpected results.')
         print(output)
 
 
-def simulate_game(initial_board: SudokuBoard, player1: SudokuAI, player2: SudokuAI, solve_sudoku_path: str, calculation_time: float = 0.5) -> None:
+def check_solver(board_file: str = 'boards/empty-4x4.txt', seed: int = 0) -> bool:
+    """
+    Plays a seeded game of greedy and random moves to the end, validating every move with the in-process solver, and
+    reports how long the validation took. Sparse boards with 4x4 regions are the hardest positions that the solver
+    has to handle in small board mode.
+    @param board_file: A text file containing the start position.
+    @param seed: The seed of the random generator that chooses the moves.
+    @return: True if the game was played to the end.
+    """
+    board = load_sudoku_from_text(Path(board_file).read_text())
+    rng = random.Random(seed)
+    taboo = set()
+    slowest = 0.0
+    start = time.perf_counter()
+    greedy = True
+    while board.squares.count(SudokuBoard.empty):
+        match = re.search(r'Generated move \((\d+),(\d+)\)', generate_move(board, greedy, taboo, rng))
+        if not match:
+            print(f'The in-process solver gives unexpected results: no move could be generated on {board_file}.')
+            return False
+        k, value = int(match.group(1)), int(match.group(2))
+        i, j = board.f2rc(k)
+        move_start = time.perf_counter()
+        output = check_move(board, k, value)
+        slowest = max(slowest, time.perf_counter() - move_start)
+        if 'has no solution' in output:
+            taboo.add((i, j, value))
+        else:
+            board.put(i, j, value)
+        greedy = not greedy
+    print(f'The in-process solver works: a game on {board_file} took {time.perf_counter() - start:.1f}s, '
+          f'the slowest move check {slowest:.2f}s.')
+    return True
+
+
+def compute_in_process(player: SudokuAI, game_state: GameState, time_limit: float) -> None:
+    """
+    Runs the computation of a move in the current process, until it returns or until its node budget is spent. If
+    the platform supports it and this is the main thread, the computation is also interrupted after time_limit
+    seconds by a SIGALRM timer. In other threads signal handlers cannot be installed, so only the node budget
+    applies. A player that never calls tick therefore depends on the wall-clock limit, and its moves are not
+    reproducible.
+    """
+    def interrupt(signum, frame):
+        raise MoveInterrupted()
+
+    use_timer = hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+    if use_timer:
+        previous_handler = signal.signal(signal.SIGALRM, interrupt)
+    try:
+        try:
+            if use_timer:
+                signal.setitimer(signal.ITIMER_REAL, time_limit)
+            player.compute_and_finish(game_state)
+        finally:
+            if use_timer:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except MoveInterrupted:
+        pass
+    except Exception as err:
+        print('Error: an exception occurred.\n', err, file=sys.stderr)
+    finally:
+        if use_timer:
+            signal.signal(signal.SIGALRM, previous_handler)
+
+
+def simulate_game(initial_board: SudokuBoard, player1: SudokuAI, player2: SudokuAI, solve_sudoku_path: str, calculation_time: float = 0.5, oracle=None, large_board: Optional[bool] = None,
+                  persistent_workers: bool = False, quiet: bool = False, log: Optional[TextIO] = None,
+                  node_budget: Optional[int] = None) -> None:
     """
     Simulates a game between two instances of SudokuAI, starting in initial_board. The first move is played by player1.
     @param initial_board: The initial position of the game.
     @param player1: The AI of the first player.
     @param player2: The AI of the second player.
-    @param solve_sudoku_path: The location of the oracle executable.
-    @param calculation_time: The amount of time in seconds for computing the best move.
+    @param solve_sudoku_path: The location of the oracle executable, or None to use the in-process oracle.
+    @param calculation_time: The maximum amount of time in seconds for computing the best move. The game continues
+    as soon as a player has finished its computation.
+    @param oracle: If given, an object with a solve_sudoku(board_text, options) method, like an OracleProcess or an
+    OracleCache, that is queried instead of running solve_sudoku_path.
+    @param large_board: If True, the game is played in large board mode, which is the default if N > 16. Unless an
+    oracle is given, moves are then validated in-process on the board itself instead of on its textual form, using a
+    pool of solutions that makes most safe moves cheap to verify, and the board is only printed at the start and the
+    end of the game. Boards with N > 16 must then be filled for at least LARGE_BOARD_MIN_FILL, otherwise a single
+    move check can take minutes.
+    @param persistent_workers: If True, each player computes its moves in one worker process for the whole game,
+    that is interrupted when the time for a move is up, instead of in a new process for every move.
+    @param quiet: If True, nothing is printed, except for errors, which are then printed to standard error.
+    @param log: If given, a file to which one JSON record is written per line: a 'start' record, a 'move' record for
+    every move with the move, the verdict ('valid', 'unsolvable', 'taboo', 'invalid', 'illegal' or 'none'), the
+    reward, the scores, the think time in seconds and the number of proposals, and a final 'result' record with the
+    winner (0 for a draw) and the reason.
+    @param node_budget: If given, every move gets a budget of this many nodes instead of a time limit. The players
+    then run in the current process, one after another, and their computation is stopped when they report more nodes
+    with SudokuAI.tick. This makes games with deterministic players reproducible. The calculation time is only used
+    as a safety limit, that is enforced in the main thread only. Players that do not report their nodes fall back to
+    this wall-clock limit, so their games are not reproducible.
     """
     import copy
     N = initial_board.N
 
+    def say(*args):
+        if not quiet:
+            print(*args)
+
+    def say_error(*args):
+        # in quiet mode standard output may carry the JSON log, so errors go to standard error
+        print(*args, file=sys.stderr if quiet else sys.stdout)
+
+    def log_record(**record):
+        if log is not None:
+            log.write(json.dumps(record, separators=(',', ':')) + '\n')
+
     game_state = GameState(initial_board, copy.deepcopy(initial_board), [], [], [0, 0])
     move_number = 0
     number_of_moves = initial_board.squares.count(SudokuBoard.empty)
-    print('Initial state')
-    print(game_state)
+    hall_checker = HallChecker(initial_board)  # detects most moves that make the sudoku unsolvable without the oracle
+    if large_board is None:
+        large_board = N > 16
+    solution_pool = SolutionPool(initial_board, size=4) if large_board else None
+    fill = 1 - number_of_moves / (N * N)
+    if large_board and oracle is None and N > 16 and fill < LARGE_BOARD_MIN_FILL:
+        print(f'Warning: only {fill:.0%} of the squares are filled. In large board mode, boards with N > 16 should be '
+              f'filled for at least {LARGE_BOARD_MIN_FILL:.0%}, otherwise validating a move can take minutes.',
+              file=sys.stderr)
+    say('Initial state')
+    say(game_state)
+    log_record(type='start', m=initial_board.m, n=initial_board.n, empty=number_of_moves,
+               calculation_time=calculation_time)
 
-    with multiprocessing.Manager() as manager:
-        # use a lock to protect assignments to best_move
-        lock = multiprocessing.Lock()
-        player1.lock = lock
-        player2.lock = lock
+    with contextlib.ExitStack() as workers_stack:
+        # use shared memory slots to store the best move; they need no lock
+        player1.best_move = MoveSlot()
+        player2.best_move = MoveSlot()
 
-        # use shared variables to store the best move
-        player1.best_move = manager.list([0, 0, 0])
-        player2.best_move = manager.list([0, 0, 0])
+        # use semaphores to stop waiting as soon as a player has finished its computation
+        player1.finished = multiprocessing.Semaphore(0)
+        player2.finished = multiprocessing.Semaphore(0)
+
+        if node_budget is not None:
+            player1.node_budget = node_budget
+            player2.node_budget = node_budget
+
+        workers = None
+        if persistent_workers and node_budget is None:
+            workers = [workers_stack.enter_context(PlayerWorker(player, game_state)) for player in (player1, player2)]
 
         while move_number < number_of_moves:
             player, player_number = (player1, 1) if len(game_state.moves) % 2 == 0 else (player2, 2)
-            print(f'-----------------------------\nCalculate a move for player {player_number}')
-            player.best_move[0] = 0
-            player.best_move[1] = 0
-            player.best_move[2] = 0
-            try:
-                process = multiprocessing.Process(target=player.compute_best_move, args=(game_state,))
-                process.start()
-                time.sleep(calculation_time)
-                lock.acquire()
-                process.terminate()
-                lock.release()
-            except Exception as err:
-                print('Error: an exception occurred.\n', err)
-            i, j, value = player.best_move
+            say(f'-----------------------------\nCalculate a move for player {player_number}')
+            player.best_move.reset()
+            while player.finished.acquire(False):
+                pass
+            if node_budget is not None:
+                start = time.perf_counter()
+                compute_in_process(player, copy.deepcopy(game_state), calculation_time)
+                think_time = time.perf_counter() - start
+                i, j, value, proposals = player.best_move.read()
+            elif workers:
+                worker = workers[player_number - 1]
+                start = time.perf_counter()
+                worker.compute_best_move(game_state)
+                player.finished.acquire(timeout=calculation_time)
+                think_time = time.perf_counter() - start
+                i, j, value, proposals = player.best_move.read()
+                worker.interrupt()
+                worker.wait(game_state)
+            else:
+                start = time.perf_counter()
+                try:
+                    process = multiprocessing.Process(target=player.compute_and_finish, args=(game_state,))
+                    process.start()
+                    player.finished.acquire(timeout=calculation_time)
+                    think_time = time.perf_counter() - start
+                    process.terminate()
+                    process.join()
+                except Exception as err:
+                    think_time = time.perf_counter() - start
+                    print('Error: an exception occurred.\n', err, file=sys.stderr)
+                i, j, value, proposals = player.best_move.read()
             best_move = Move(i, j, value)
-            print(f'Best move: {best_move}')
+            say(f'Best move: {best_move}')
             player_score = 0
-            if best_move != Move(0, 0, 0):
-                if TabooMove(i, j, value) in game_state.taboo_moves:
-                    print(f'Error: {best_move} is a taboo move. Player {2-player_number} wins the game.')
-                    return
-                board_text = str(game_state.board)
-                options = f'--move "{game_state.board.rc2f(i, j)} {value}"'
-                output = solve_sudoku(solve_sudoku_path, board_text, options)
+            winner = None  # the winner if the move loses the game
+            if best_move == Move(0, 0, 0):
+                verdict = 'none'
+                say(f'No move was supplied. Player {3-player_number} wins the game.')
+                winner = 3 - player_number
+            elif TabooMove(i, j, value) in game_state.taboo_moves:
+                verdict = 'taboo'
+                say_error(f'Error: {best_move} is a taboo move. Player {3-player_number} wins the game.')
+                winner = 3 - player_number
+            else:
+                board = game_state.board
+                if 0 <= i < N and 0 <= j < N and 1 <= value <= N and board.get(i, j) == SudokuBoard.empty \
+                        and board.is_legal(i, j, value) and not hall_checker.check_move(i, j, value):
+                    output = f"The sudoku has no solution after move '{board.rc2f(i, j)} {value}'."
+                elif large_board and oracle is None:
+                    output = check_move(board, board.rc2f(i, j), value, pool=solution_pool)
+                else:
+                    board_text = str(board)
+                    options = f'--move "{board.rc2f(i, j)} {value}"'
+                    if oracle is not None:
+                        output = oracle.solve_sudoku(board_text, options)
+                    else:
+                        output = cached_solve_sudoku(solve_sudoku_path, board_text, options)
                 if 'Invalid move' in output:
-                    print(f'Error: {best_move} is not a valid move. Player {3-player_number} wins the game.')
-                    return
-                if 'Illegal move' in output:
-                    print(f'Error: {best_move} is not a legal move. Player {3-player_number} wins the game.')
-                    return
-                if 'has no solution' in output:
-                    print(f'The sudoku has no solution after the move {best_move}.')
+                    verdict = 'invalid'
+                    say_error(f'Error: {best_move} is not a valid move. Player {3-player_number} wins the game.')
+                    winner = 3 - player_number
+                elif 'Illegal move' in output:
+                    verdict = 'illegal'
+                    say_error(f'Error: {best_move} is not a legal move. Player {3-player_number} wins the game.')
+                    winner = 3 - player_number
+                elif 'has no solution' in output:
+                    verdict = 'unsolvable'
+                    say(f'The sudoku has no solution after the move {best_move}.')
                     player_score = 0
                     game_state.moves.append(TabooMove(i, j, value))
                     game_state.taboo_moves.append(TabooMove(i, j, value))
-                if 'The score is' in output:
+                else:
                     match = re.search(r'The score is ([-\d]+)', output)
-                    if match:
-                        player_score = int(match.group(1))
-                        game_state.board.put(i, j, value)
-                        game_state.moves.append(best_move)
-                        move_number = move_number + 1
-                    else:
+                    if not match:
                         raise RuntimeError(f'Unexpected output of sudoku solver: "{output}".')
-            else:
-                print(f'No move was supplied. Player {3-player_number} wins the game.')
-                return
+                    verdict = 'valid'
+                    player_score = int(match.group(1))
+                    game_state.board.put(i, j, value)
+                    hall_checker.put(i, j, value)
+                    if solution_pool is not None:
+                        solution_pool.play(i, j, value)
+                    game_state.moves.append(best_move)
+                    move_number = move_number + 1
             game_state.scores[player_number-1] = game_state.scores[player_number-1] + player_score
-            print(f'Reward: {player_score}')
-            print(game_state)
+            record = dict(type='move', player=player_number, move=[i, j, value], verdict=verdict, reward=player_score,
+                          scores=game_state.scores, think_time=round(think_time, 6), proposals=proposals)
+            if node_budget is not None:
+                record['nodes'] = player.nodes
+            log_record(**record)
+            if winner is not None:
+                log_record(type='result', winner=winner, reason=verdict, scores=game_state.scores,
+                           moves=len(game_state.moves))
+                return
+            say(f'Reward: {player_score}')
+            if large_board:
+                say(f'Score: {game_state.scores[0]} - {game_state.scores[1]}')
+            else:
+                say(game_state)
+        if large_board:
+            say(game_state)
         if game_state.scores[0] > game_state.scores[1]:
-            print('Player 1 wins the game.')
+            say('Player 1 wins the game.')
+            winner = 1
         elif game_state.scores[0] == game_state.scores[1]:
-            print('The game ends in a draw.')
-        elif game_state.scores[0] < game_state.scores[1]:
-            print('Player 2 wins the game.')
+            say('The game ends in a draw.')
+            winner = 0
+        else:
+            say('Player 2 wins the game.')
+            winner = 2
+        log_record(type='result', winner=winner, reason='score', scores=game_state.scores, moves=len(game_state.moves))
 
 
 def main():
@@ -127,14 +316,35 @@ def main():
     cmdline_parser.add_argument('--first', help="the module name of the first player's SudokuAI class (default: random_player)", default='random_player')
     cmdline_parser.add_argument('--second', help="the module name of the second player's SudokuAI class (default: random_player)", default='random_player')
     cmdline_parser.add_argument('--time', help="the time (in seconds) for computing a move (default: 0.5)", type=float, default=0.5)
-    cmdline_parser.add_argument('--check', help="check if the solve_sudoku program works", action='store_true')
+    cmdline_parser.add_argument('--check', help="check if the oracle works: the solve_sudoku program, or the in-process python oracle if it is not used", action='store_true')
+    cmdline_parser.add_argument('--check-solver', help="play a seeded game to the end with the in-process solver, on the board given by --board (default: boards/empty-4x4.txt), and report the time it took", action='store_true')
     cmdline_parser.add_argument('--board', metavar='FILE', type=str, help='a text file containing the start position')
+    cmdline_parser.add_argument('--oracle-server', help="validate moves using one long-lived python oracle process for the whole game", action='store_true')
+    cmdline_parser.add_argument('--oracle-cache', metavar='FILE', type=str, help="store oracle results in this database, shared with the players and with later games")
+    cmdline_parser.add_argument('--large-board', help="validate moves in-process and only print the board at the start and the end of the game (default if N > 16)", action='store_true', default=None)
+    cmdline_parser.add_argument('--persistent', help="run each player in one worker process for the whole game, that keeps its state between moves", action='store_true')
+    cmdline_parser.add_argument('--quiet', help="do not print the board and the progress of the game", action='store_true')
+    cmdline_parser.add_argument('--log-format', help="the format of the game log: text prints the progress of the game, jsonl writes one JSON record per move (default: text)", choices=['text', 'jsonl'], default='text')
+    cmdline_parser.add_argument('--log', metavar='FILE', type=str, help="append the JSON records to this file instead of writing them to standard output")
+    cmdline_parser.add_argument('--nodes', help="give every move a budget of this many nodes, reported by the players with tick, instead of a time limit; the players run in-process and the game is reproducible, --time is only used as a safety limit; players that do not call tick fall back to that wall-clock limit and are not reproducible", type=int)
+    cmdline_parser.add_argument('--seed', help="the seed of the random generator in node budget mode and of the game played by --check-solver (default: 0)", type=int, default=0)
+    cmdline_parser.add_argument('--python-oracle', help="use the in-process python oracle instead of the solve_sudoku program (default if the program is not found)", action='store_true')
     args = cmdline_parser.parse_args()
 
+    if args.python_oracle or not os.path.exists(solve_sudoku_path):
+        solve_sudoku_path = None
+    if args.oracle_cache:
+        os.environ[ORACLE_CACHE_VARIABLE] = args.oracle_cache  # inherited by the processes of the players
+
     if args.check:
         check_oracle(solve_sudoku_path)
         return
 
+    if args.check_solver:
+        if not check_solver(board_file=args.board or 'boards/empty-4x4.txt', seed=args.seed):
+            sys.exit(1)
+        return
+
     board_text = '''2 2
        1   2   .   4
        .   4   .   2
@@ -154,7 +364,19 @@ def main():
     if args.second in ('random_player', 'greedy_player'):
         player2.solve_sudoku_path = solve_sudoku_path
 
-    simulate_game(board, player1, player2, solve_sudoku_path=solve_sudoku_path, calculation_time=args.time)
+    if args.nodes is not None:
+        random.seed(args.seed)  # the players run in this process
+    quiet = args.quiet or args.log_format == 'jsonl'
+    with contextlib.ExitStack() as stack:
+        log = None
+        if args.log_format == 'jsonl':
+            log = stack.enter_context(open(args.log, 'a', buffering=1 << 16)) if args.log else sys.stdout
+        if args.oracle_server:
+            oracle = stack.enter_context(OracleProcess.python())
+            cache = OracleCache(oracle.solve_sudoku, filename=args.oracle_cache)
+            simulate_game(board, player1, player2, solve_sudoku_path=solve_sudoku_path, calculation_time=args.time, oracle=cache, large_board=args.large_board, persistent_workers=args.persistent, quiet=quiet, log=log, node_budget=args.nodes)
+        else:
+            simulate_game(board, player1, player2, solve_sudoku_path=solve_sudoku_path, calculation_time=args.time, large_board=args.large_board, persistent_workers=args.persistent, quiet=quiet, log=log, node_budget=args.nodes)
 
 
 if __name__ == '__main__':